@@ -0,0 +1,209 @@
+"""
+Streaming alias-ambiguity detection over PubTator gene mentions.
+
+Makes one pass over gene2pubtator-style TSV files (PMID, Type, ConceptID,
+Mentions, Resource; optionally gzipped) and keeps approximate counts in
+bounded memory:
+- a count-min sketch of publications per gene, per mention text (alias) and
+  per (alias, gene) pair
+- a k-minimum-values sketch of the number of distinct genes per alias, for
+  the symbols and aliases of the proteins in the dataset only
+
+For each protein, the ambiguity score is the share of the publications
+mentioning one of its symbols/aliases that PubTator maps to another gene.
+Aliases shared with many genes are flagged. The per-protein scores are written
+to output/ambiguity_scores.tsv, which the app picks up:
+
+    python alias_ambiguity.py gene2pubtator3.gz [--alias-report output/alias_report.tsv]
+"""
+import argparse
+import csv
+
+import numpy as np
+import pandas as pd
+
+from biocurator_data import AMBIGUITY_SCORES_TSV, PUBTATOR_PICKLE, load_dataset
+
+GENE2PUBTATOR_COLUMNS = ['pmid', 'type', 'concept_id', 'mentions', 'resource']
+
+
+class CountMinSketch:
+    """Approximate counts of string keys in a fixed depth x width table (never underestimates)"""
+
+    def __init__(self, width=2 ** 22, depth=4, seed=0):
+        self.width = width
+        self.table = np.zeros((depth, width), dtype=np.uint32)
+        # One 16-character hash key per row gives independent hash functions
+        self.hash_keys = [f"{seed:08d}{row:08d}" for row in range(depth)]
+
+    def _indexes(self, keys):
+        keys = np.asarray(keys, dtype=object)
+        return [pd.util.hash_array(keys, hash_key=hash_key, categorize=False) % self.width
+                for hash_key in self.hash_keys]
+
+    def add(self, keys):
+        """Increment the count of every key (repeated keys are counted repeatedly)"""
+        if len(keys) == 0:
+            return
+        for row, indexes in enumerate(self._indexes(keys)):
+            self.table[row] += np.bincount(indexes, minlength=self.width).astype(np.uint32)
+
+    def query(self, keys):
+        """Estimated counts of the keys"""
+        if len(keys) == 0:
+            return np.zeros(0, dtype=np.uint32)
+        return np.min([self.table[row][indexes] for row, indexes in enumerate(self._indexes(keys))], axis=0)
+
+
+class DistinctCounter:
+    """K-minimum-values estimate of the number of distinct values per key, for a bounded set of keys"""
+
+    def __init__(self, k=64):
+        self.k = k
+        self.minimums = {}
+
+    def add(self, keys, values):
+        hashes = pd.util.hash_array(np.asarray(values, dtype=object), categorize=False)
+        pairs = pd.DataFrame({'key': np.asarray(keys, dtype=object), 'hash': hashes}).drop_duplicates()
+        for key, group in pairs.groupby('key', sort=False):
+            current = self.minimums.get(key)
+            merged = group['hash'].values if current is None else np.concatenate([current, group['hash'].values])
+            self.minimums[key] = np.unique(merged)[:self.k]
+
+    def estimate(self, key):
+        minimums = self.minimums.get(key)
+        if minimums is None:
+            return 0
+        if len(minimums) < self.k:
+            return len(minimums)
+        return int(round((self.k - 1) / (float(minimums[-1]) / 2 ** 64)))
+
+
+def normalize_alias(values):
+    """Case-insensitive, whitespace-trimmed mention text"""
+    return values.str.strip().str.lower()
+
+
+def protein_aliases(non_nd_df):
+    """
+    Long DataFrame (uniprot_id, ncbi_gene, alias) of the normalized gene symbol
+    and aliases of every protein
+    """
+    symbols = non_nd_df['gene_name'].fillna('').str.replace(r'\s*\{.*\}', '', regex=True)
+    aliases = pd.DataFrame({
+        'uniprot_id': non_nd_df['uniprot_id'],
+        'ncbi_gene': non_nd_df['ncbi_gene'].astype(str),
+        'alias': symbols + ',' + non_nd_df['gene_aliases'].fillna(''),
+    })
+    aliases['alias'] = aliases['alias'].str.split(',')
+    aliases = aliases.explode('alias')
+    aliases['alias'] = normalize_alias(aliases['alias'])
+    return aliases[aliases['alias'] != ''].drop_duplicates().reset_index(drop=True)
+
+
+def iter_gene_mentions(paths, chunksize=200_000):
+    """Yield (gene, alias) DataFrames with one row per publication, gene and distinct mention text"""
+    for path in paths:
+        reader = pd.read_csv(
+            path, sep="\t", header=None, names=GENE2PUBTATOR_COLUMNS,
+            usecols=['pmid', 'type', 'concept_id', 'mentions'], dtype=str,
+            quoting=csv.QUOTE_NONE, chunksize=chunksize
+        )
+        for chunk in reader:
+            chunk = chunk[chunk['type'] == 'Gene'].dropna(subset=['concept_id', 'mentions'])
+            chunk = chunk.assign(
+                gene=chunk['concept_id'].str.split(';'),
+                alias=chunk['mentions'].str.split('|')
+            ).explode('gene').explode('alias')
+            chunk['alias'] = normalize_alias(chunk['alias'])
+            chunk = chunk[(chunk['alias'] != '') & (chunk['gene'] != '')]
+            yield chunk.drop_duplicates(['pmid', 'gene', 'alias'])[['pmid', 'gene', 'alias']]
+
+
+def scan_gene_mentions(paths, target_aliases, width=2 ** 22, depth=4, k=64):
+    """
+    Stream the gene-mention files once.
+
+    Returns:
+    - CountMinSketch of 'gene:<id>', 'alias:<text>' and 'pair:<text>|<id>' publication counts
+    - DistinctCounter of the genes mentioned by each target alias
+    """
+    sketch = CountMinSketch(width, depth)
+    distinct = DistinctCounter(k)
+    target_aliases = set(target_aliases)
+    for mentions in iter_gene_mentions(paths):
+        genes = mentions.drop_duplicates(['pmid', 'gene'])['gene']
+        sketch.add(('gene:' + genes).values)
+        sketch.add(('alias:' + mentions['alias']).values)
+        sketch.add(('pair:' + mentions['alias'] + '|' + mentions['gene']).values)
+        targets = mentions[mentions['alias'].isin(target_aliases)]
+        distinct.add(targets['alias'].values, targets['gene'].values)
+    return sketch, distinct
+
+
+def ambiguity_scores(aliases, sketch, distinct, min_genes=5, min_other_fraction=0.5):
+    """
+    Score the aliases of every protein against the sketches.
+
+    Returns:
+    - DataFrame with one row per protein alias: publications mentioning the alias, those
+      mapped to the protein's gene, the share mapped to other genes, the estimated number
+      of distinct genes and whether the alias is flagged as colliding
+    - DataFrame with one row per protein: ambiguity_score, the flagged aliases and the
+      estimated number of publications of its gene
+    """
+    report = aliases.copy()
+    report['alias_publications'] = sketch.query(('alias:' + report['alias']).values).astype(np.int64)
+    report['gene_publications'] = np.minimum(
+        sketch.query(('pair:' + report['alias'] + '|' + report['ncbi_gene']).values),
+        report['alias_publications']
+    ).astype(np.int64)
+    other = report['alias_publications'] - report['gene_publications']
+    report['other_fraction'] = (other / report['alias_publications'].where(report['alias_publications'] > 0)).fillna(0.0)
+    report['distinct_genes'] = [distinct.estimate(alias) for alias in report['alias']]
+    report['colliding'] = (report['distinct_genes'] >= min_genes) & (report['other_fraction'] >= min_other_fraction)
+
+    report['other_publications'] = other
+    per_protein = report.groupby('uniprot_id', sort=False).agg(
+        alias_publications=('alias_publications', 'sum'),
+        other_publications=('other_publications', 'sum'),
+    )
+    scores = pd.DataFrame({
+        'uniprot_id': per_protein.index,
+        'ambiguity_score': (per_protein['other_publications'] /
+                            per_protein['alias_publications'].where(per_protein['alias_publications'] > 0)
+                            ).fillna(0.0).round(4).values,
+    })
+    flagged = report[report['colliding']].groupby('uniprot_id')['alias'].agg(', '.join)
+    scores['ambiguous_aliases'] = scores['uniprot_id'].map(flagged).fillna('')
+    genes = aliases.drop_duplicates('uniprot_id').set_index('uniprot_id')['ncbi_gene']
+    scores['gene_pubtator_publications'] = sketch.query(('gene:' + scores['uniprot_id'].map(genes)).values).astype(np.int64)
+    return report.drop(columns='other_publications'), scores
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("mentions", nargs="+", help="gene2pubtator-style TSV files (optionally gzipped)")
+    parser.add_argument("--data", default=PUBTATOR_PICKLE, help="Path to the pubtator pickle")
+    parser.add_argument("--out", default=AMBIGUITY_SCORES_TSV, help="Output TSV of per-protein scores")
+    parser.add_argument("--alias-report", help="Optional output TSV of per-alias statistics")
+    parser.add_argument("--width", type=int, default=2 ** 22, help="Count-min sketch width")
+    parser.add_argument("--depth", type=int, default=4, help="Count-min sketch depth")
+    parser.add_argument("--min-genes", type=int, default=5, help="Distinct genes for an alias to be flagged")
+    parser.add_argument("--min-other-fraction", type=float, default=0.5,
+                        help="Share of an alias' publications mapped to other genes for it to be flagged")
+    args = parser.parse_args()
+
+    non_nd_df, _ = load_dataset(args.data)
+    aliases = protein_aliases(non_nd_df)
+    sketch, distinct = scan_gene_mentions(args.mentions, aliases['alias'], args.width, args.depth)
+    report, scores = ambiguity_scores(aliases, sketch, distinct, args.min_genes, args.min_other_fraction)
+    scores.to_csv(args.out, sep="\t", index=False)
+    print(f"Wrote ambiguity scores for {len(scores)} proteins to {args.out}")
+    if args.alias_report:
+        report.to_csv(args.alias_report, sep="\t", index=False)
+        print(f"Wrote {int(report['colliding'].sum())} colliding of {len(report)} aliases to {args.alias_report}")
+
+
+if __name__ == "__main__":
+    main()
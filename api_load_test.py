@@ -0,0 +1,138 @@
+"""
+Local load test for api_server.py.
+
+Starts the API on an ephemeral port (or targets --url), replays a mix of
+protein and publication queries from several keep-alive client threads, and
+reports sustained requests/second and latency percentiles:
+
+    python api_load_test.py --clients 8 --duration 20
+
+Two kinds of queries are mixed. Warm queries are a fixed set of URLs, answered
+from the server's response cache after the first request. Cold queries have
+random filters (PE levels, fraction, years, page), so the server filters the
+dataset and encodes the response; --cold-fraction sets their share. The two are
+reported separately.
+
+Every request gets a full 200 response by default. With --etag, clients revalidate
+with If-None-Match, as a browser would, and the empty 304 responses are reported
+separately from the 200s.
+"""
+import argparse
+import http.client
+import random
+import threading
+import time
+from urllib.parse import urlencode, urlsplit
+
+import numpy as np
+
+from api_server import create_server
+from biocurator_data import PUBTATOR_PICKLE
+
+QUERIES = [
+    "/proteins",
+    "/proteins?page=2",
+    "/proteins?pe=1,2&min_fraction=0.3",
+    "/proteins?search=kinase",
+    "/proteins?min_last_reviewed=2005&max_last_reviewed=2015",
+    "/publications?min_fraction=0.3&min_year=2015",
+    "/publications?pe=1&page=3&page_size=100",
+    "/health",
+]
+
+
+def random_query(rng):
+    """A /proteins or /publications query with random filters, most likely not in the server caches"""
+    min_year = rng.randint(1990, 2020)
+    params = {
+        'pe': ','.join(str(level) for level in sorted(rng.sample(range(1, 6), rng.randint(1, 5)))),
+        'min_fraction': f"{rng.randint(0, 50) / 100:.2f}",
+        'min_year': min_year,
+        'max_year': rng.randint(min_year, 2025),
+        'page': rng.randint(1, 3),
+    }
+    return f"{rng.choice(['/proteins', '/publications'])}?{urlencode(params)}"
+
+
+def run_client(host, port, deadline, latencies, use_etag, cold_fraction, seed):
+    """
+    Send requests over one keep-alive connection until the deadline, recording latencies
+    per kind of query ('cold' or 'warm') and status code
+    """
+    rng = random.Random(seed)
+    conn = http.client.HTTPConnection(host, port, timeout=30)
+    etags = {}
+    while time.perf_counter() < deadline:
+        kind = 'cold' if rng.random() < cold_fraction else 'warm'
+        path = random_query(rng) if kind == 'cold' else rng.choice(QUERIES)
+        headers = {'Accept-Encoding': 'gzip'}
+        if use_etag and path in etags:
+            headers['If-None-Match'] = etags[path]
+        start = time.perf_counter()
+        conn.request("GET", path, headers=headers)
+        response = conn.getresponse()
+        response.read()
+        latencies.setdefault((kind, response.status), []).append(time.perf_counter() - start)
+        if response.getheader('ETag'):
+            etags[path] = response.getheader('ETag')
+    conn.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", help="Target a running server instead of starting one")
+    parser.add_argument("--data", default=PUBTATOR_PICKLE, help="Path to the pubtator pickle")
+    parser.add_argument("--clients", type=int, default=8, help="Number of concurrent client threads")
+    parser.add_argument("--duration", type=float, default=20, help="Test duration in seconds")
+    parser.add_argument("--etag", action="store_true",
+                        help="Revalidate with If-None-Match (mostly measures 304 responses)")
+    parser.add_argument("--cold-fraction", type=float, default=0.5,
+                        help="Share of queries with random filters, not served from the server caches")
+    args = parser.parse_args()
+
+    server = None
+    if args.url:
+        url = urlsplit(args.url)
+        host, port = url.hostname, url.port or 80
+    else:
+        server = create_server("127.0.0.1", 0, args.data, quiet=True)
+        host, port = server.server_address
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        # Warm the caches for the fixed queries, so that they measure cached responses
+        for path in QUERIES:
+            conn = http.client.HTTPConnection(host, port)
+            conn.request("GET", path)
+            conn.getresponse().read()
+            conn.close()
+
+    latencies = [{} for _ in range(args.clients)]
+    deadline = time.perf_counter() + args.duration
+    threads = [
+        threading.Thread(
+            target=run_client,
+            args=(host, port, deadline, latencies[seed], args.etag, args.cold_fraction, seed)
+        )
+        for seed in range(args.clients)
+    ]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+
+    keys = sorted({key for client in latencies for key in client})
+    num_requests = sum(len(values) for client in latencies for values in client.values())
+    print(f"Clients: {args.clients}, duration: {elapsed:.1f}s, requests: {num_requests}")
+    for kind, status in keys:
+        latencies_ms = np.concatenate([client.get((kind, status), []) for client in latencies]) * 1000
+        label = 'Cold (random filters)' if kind == 'cold' else 'Warm (cached responses)'
+        print(f"{label}, status {status}: {len(latencies_ms)} requests, "
+              f"{len(latencies_ms) / elapsed:.1f} requests/second, "
+              "latency (ms): p50 {:.1f}, p95 {:.1f}, p99 {:.1f}".format(*np.percentile(latencies_ms, [50, 95, 99])))
+    if server is not None:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
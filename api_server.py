@@ -0,0 +1,284 @@
+"""
+Headless JSON API over the curated dataset.
+
+Serves the same dataset and filters as app_biocurator.py:
+
+    python api_server.py --port 8600
+
+Endpoints:
+- GET /proteins                          filtered proteins
+- GET /publications                      filtered publications (one row per protein and PMID)
+- GET /proteins/<uniprot_id>/publications filtered publications of one protein
+- GET /health
+
+Query parameters (all optional, defaults match the grid defaults):
+pe (comma-separated PE levels), min_fraction, max_fraction, min_year, max_year,
+min_last_reviewed, max_last_reviewed, search, page (1-based), page_size.
+"""
+import argparse
+import gzip
+import hashlib
+import json
+import math
+import os
+import threading
+from collections import OrderedDict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, unquote, urlsplit
+
+import numpy as np
+import pandas as pd
+
+from biocurator_data import PUBTATOR_PICKLE, default_filter_state, filter_dataset, load_dataset
+from biocurator_export import iter_publication_chunks
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 1000
+# Responses smaller than this are not worth compressing
+GZIP_MIN_SIZE = 1024
+
+
+class BadRequest(ValueError):
+    pass
+
+
+class NotFound(LookupError):
+    pass
+
+
+class LRUCache:
+    """Thread-safe least-recently-used mapping"""
+
+    def __init__(self, size):
+        self.size = size
+        self._items = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            if key not in self._items:
+                return None
+            self._items.move_to_end(key)
+            return self._items[key]
+
+    def put(self, key, value):
+        with self._lock:
+            self._items[key] = value
+            while len(self._items) > self.size:
+                self._items.popitem(last=False)
+
+
+class CuratedDataset:
+    """The dataset, its default filters and caches of filtered views and encoded responses"""
+
+    def __init__(self, path=PUBTATOR_PICKLE, cache_size=64):
+        self.non_nd_df, self.store = load_dataset(path)
+        self.defaults = default_filter_state(self.non_nd_df, self.store)
+        stat = os.stat(path)
+        # Changes whenever the dataset file is replaced, so clients revalidate
+        self.version = hashlib.sha1(f"{path}:{stat.st_size}:{stat.st_mtime_ns}".encode()).hexdigest()[:16]
+        self.views = LRUCache(cache_size)
+        self.responses = LRUCache(cache_size * 8)
+
+    def parse_filters(self, params):
+        """Build a FilterState from query parameters, falling back to the defaults"""
+        if self.defaults is None:
+            # No filter bounds, and nothing to filter
+            raise NotFound("The dataset has no publications")
+        def get(name, cast, default):
+            values = params.get(name)
+            if not values or values[0] == '':
+                return default
+            try:
+                return cast(values[0])
+            except ValueError:
+                raise BadRequest(f"Invalid value for {name}: {values[0]}")
+
+        pe_levels = get('pe', lambda v: tuple(sorted(int(x) for x in v.split(','))), None)
+        return self.defaults._replace(
+            pe_levels=pe_levels,
+            min_fraction=get('min_fraction', float, self.defaults.min_fraction),
+            max_fraction=get('max_fraction', float, self.defaults.max_fraction),
+            min_year=get('min_year', int, self.defaults.min_year),
+            max_year=get('max_year', int, self.defaults.max_year),
+            min_last_reviewed=get('min_last_reviewed', int, self.defaults.min_last_reviewed),
+            max_last_reviewed=get('max_last_reviewed', int, self.defaults.max_last_reviewed),
+            search_query=get('search', str, ''),
+            new_only=get('new_only', lambda v: v.lower() in ('1', 'true', 'yes'), False),
+            collapse_duplicates=get('collapse', lambda v: v.lower() in ('1', 'true', 'yes'), False)
+        )
+
+    def view(self, filters):
+        """
+        Filtered (proteins, links) for a FilterState, cached. The links are ordered as the
+        publication rows: by the position of their protein, then as in the dataset.
+        Publications are only joined per page, so a cached view holds no copy of them.
+        """
+        result = self.views.get(filters)
+        if result is not None:
+            return result
+        df, filtered_links = filter_dataset(self.non_nd_df, self.store, filters)
+        positions = pd.Index(df['uniprot_id']).get_indexer(filtered_links['uniprot_id'])
+        order = np.argsort(positions, kind='stable')
+        result = (df.reset_index(drop=True), filtered_links.iloc[order[positions[order] >= 0]])
+        self.views.put(filters, result)
+        return result
+
+    def publications(self, proteins, links):
+        """Long-format publication rows (as in the exports) of the given slice of view links"""
+        proteins = proteins[proteins['uniprot_id'].isin(links['uniprot_id'])]
+        chunk = next(iter_publication_chunks(proteins, self.store, links, chunk_size=max(len(proteins), 1)), None)
+        return pd.DataFrame() if chunk is None else chunk.reset_index(drop=True)
+
+
+def to_records(df):
+    """JSON-serializable list of row dictionaries, with missing values as None"""
+    return df.astype(object).where(df.notna(), None).to_dict('records')
+
+
+def paginate(df, params, rows=None):
+    """
+    Slice a DataFrame according to the page and page_size parameters.
+    rows, if given, converts the slice of df to the rows of the page (e.g. links to publications).
+    """
+    try:
+        page = int(params.get('page', ['1'])[0])
+        page_size = int(params.get('page_size', [str(DEFAULT_PAGE_SIZE)])[0])
+    except ValueError:
+        raise BadRequest("page and page_size must be integers")
+    if page < 1 or not 1 <= page_size <= MAX_PAGE_SIZE:
+        raise BadRequest(f"page must be >= 1 and page_size between 1 and {MAX_PAGE_SIZE}")
+    start = (page - 1) * page_size
+    results = df.iloc[start:start + page_size]
+    return {
+        'total': len(df),
+        'page': page,
+        'page_size': page_size,
+        'num_pages': math.ceil(len(df) / page_size),
+        'results': to_records(results if rows is None else rows(results)),
+    }
+
+
+def json_default(value):
+    """Convert numpy scalars and other leftovers for json.dumps"""
+    if hasattr(value, 'item'):
+        return value.item()
+    return str(value)
+
+
+class APIHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    # Headers and body are written separately; avoid the Nagle/delayed-ACK stall on keep-alive
+    disable_nagle_algorithm = True
+    dataset = None
+
+    def do_GET(self):
+        url = urlsplit(self.path)
+        params = parse_qs(url.query)
+        parts = [unquote(part) for part in url.path.strip('/').split('/') if part]
+        etag = '"' + hashlib.sha1(f"{self.dataset.version}:{url.path}?{url.query}".encode()).hexdigest() + '"'
+        accepts_gzip = 'gzip' in self.headers.get('Accept-Encoding', '')
+        # Only valid requests are cached, so their ETag can be checked before routing
+        cached = self.dataset.responses.get((url.path, url.query, accepts_gzip))
+        if cached is None:
+            try:
+                body = self.route(parts, params)
+            except BadRequest as e:
+                self.send_json(400, {'error': str(e)})
+                return
+            except NotFound as e:
+                self.send_json(404, {'error': str(e)})
+                return
+            if body is None:
+                self.send_json(404, {'error': f"Not found: {url.path}"})
+                return
+            cached = self.encode(body, accepts_gzip)
+            self.dataset.responses.put((url.path, url.query, accepts_gzip), cached)
+        if self.headers.get('If-None-Match') == etag:
+            self.send_not_modified(etag)
+            return
+        self.send_payload(200, *cached, etag=etag)
+
+    def route(self, parts, params):
+        if parts == ['health']:
+            return {'status': 'ok', 'version': self.dataset.version}
+        protein_publications = len(parts) == 3 and parts[0] == 'proteins' and parts[2] == 'publications'
+        # Unknown paths are answered before filtering the dataset
+        if parts not in (['proteins'], ['publications']) and not protein_publications:
+            return None
+        filters = self.dataset.parse_filters(params)
+        proteins, links = self.dataset.view(filters)
+        publications = lambda links: self.dataset.publications(proteins, links)
+        if parts == ['proteins']:
+            return paginate(proteins, params)
+        if parts == ['publications']:
+            return paginate(links, params, publications)
+        if not (proteins['uniprot_id'] == parts[1]).any():
+            return None
+        return paginate(links[links['uniprot_id'] == parts[1]], params, publications)
+
+    def encode(self, body, accepts_gzip):
+        """JSON-encode a response body, gzipped when accepted and worth it"""
+        payload = json.dumps(body, default=json_default).encode()
+        gzipped = accepts_gzip and len(payload) >= GZIP_MIN_SIZE
+        if gzipped:
+            payload = gzip.compress(payload, compresslevel=5)
+        return payload, gzipped
+
+    def send_json(self, status, body):
+        accepts_gzip = 'gzip' in self.headers.get('Accept-Encoding', '')
+        self.send_payload(status, *self.encode(body, accepts_gzip))
+
+    def send_not_modified(self, etag):
+        self.send_response(304)
+        self.send_header('ETag', etag)
+        self.send_header('Content-Length', '0')
+        self.end_headers()
+
+    def send_payload(self, status, payload, gzipped, etag=None):
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(payload)))
+        self.send_header('Vary', 'Accept-Encoding')
+        if gzipped:
+            self.send_header('Content-Encoding', 'gzip')
+        if etag:
+            self.send_header('ETag', etag)
+            self.send_header('Cache-Control', 'public, max-age=300')
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, format, *args):
+        if not self.server.quiet:
+            super().log_message(format, *args)
+
+
+def create_server(host="127.0.0.1", port=8600, path=PUBTATOR_PICKLE, quiet=False):
+    """Load the dataset and create (without starting) the HTTP server"""
+    handler = type('BoundAPIHandler', (APIHandler,), {'dataset': CuratedDataset(path)})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    server.quiet = quiet
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8600)
+    parser.add_argument("--data", default=PUBTATOR_PICKLE, help="Path to the pubtator pickle")
+    parser.add_argument("--quiet", action="store_true", help="Do not log requests")
+    args = parser.parse_args()
+
+    server = create_server(args.host, args.port, args.data, args.quiet)
+    print(f"Serving {args.data} on http://{args.host}:{args.port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
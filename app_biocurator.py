@@ -1,43 +1,110 @@
+import os
 import streamlit as st
-import pandas as pd
 import altair as alt
 from st_aggrid import AgGrid, GridOptionsBuilder, JsCode
-import pickle as cp
-import base64
-import sys
 
-# Pandas 2.0+ compatibility shim for unpickling data from older pandas versions
-if pd.__version__.split('.')[0] in ['2', '3']:
-    import pandas.core.indexes.base
-    sys.modules['pandas.core.indexes.numeric'] = pandas.core.indexes.base
-    # Map classes that were removed in pandas 2.0
-    pandas.core.indexes.base.Int64Index = pd.Index
-    pandas.core.indexes.base.UInt64Index = pd.Index
-    pandas.core.indexes.base.Float64Index = pd.Index
+from biocurator_cache import (EXPORT_MAX_LINKS, build_export, build_nd_export, can_export, get_dataset,
+                              get_default_filters, get_filter_bounds, get_grid_view, get_nd_dataset, get_nd_view,
+                              get_nd_year_aspect_counts, get_pe_counts, get_protein_publications,
+                              get_publication_payload, get_summary_years, is_out_of_core, use_client_filtering)
+from biocurator_data import (ND_PROTEINS_TSV, NEW_SINCE_RELEASE, NUM_TOP_PUBLICATIONS, SUMMARY_COLUMNS, FilterState)
+from biocurator_export import EXPORT_COLUMNS, EXPORT_FORMATS, PROTEIN_COLUMNS
 
-PUBTATOR_PICKLE = "output/pubtator_pubs.pkl"
-
-
-def display_nd_data(nd_df):
-    """Display ND proteins information"""
+@st.fragment
+def display_nd_data(nd_df, year_aspect_counts):
+    """
+    Display ND proteins information.
+    Filtering happens server-side on the shared ND table and only the current
+    page is sent to the browser, so the page stays responsive for full-GAF tables.
+    Runs as a fragment: changing a filter or the page only reruns this tab.
+    """
     st.header("Proteins with ND Status")
     
     # Show total number of ND proteins
     st.metric("Total ND Proteins", len(nd_df))
+    if year_aspect_counts.empty:
+        st.info("The ND annotations file has no annotations to filter.")
+        return
+    
+    # Filters are built from the aggregated counts rather than the full table
+    col1, col2 = st.columns(2)
+    with col1:
+        st.write("Filter ND annotations by aspect")
+        selected_aspects, _ = create_checkbox_filter(
+            year_aspect_counts,
+            'aspect',
+            default_state=True,
+            num_columns=3
+        )
+    with col2:
+        st.write("Filter ND annotations by year range")
+        year_col1, year_col2 = st.columns(2)
+        min_year = int(year_aspect_counts['year'].min())
+        max_year = int(year_aspect_counts['year'].max())
+        with year_col1:
+            min_year_input = st.number_input(
+                "Minimum year",
+                min_value=min_year,
+                max_value=max_year,
+                value=min_year,
+                step=1,
+                key="nd_min_year"
+            )
+        with year_col2:
+            max_year_input = st.number_input(
+                "Maximum year",
+                min_value=min_year,
+                max_value=max_year,
+                value=max_year,
+                step=1,
+                key="nd_max_year"
+            )
     
-    nd_df['year'] = nd_df['year'].astype(str)
-    # Display the dataframe
-    st.dataframe(nd_df, use_container_width=True)
+    selected_aspects = tuple(selected_aspects)
+    filtered_nd_df = get_nd_view(selected_aspects, min_year_input, max_year_input)
+    st.metric("ND annotations matching filters", len(filtered_nd_df))
     
-    # Create visualization for ND annotations
-    chart = alt.Chart(nd_df).mark_bar().encode(
+    # Paginate the filtered table
+    page_col1, page_col2 = st.columns(2)
+    with page_col1:
+        page_size = st.selectbox("Rows per page", [50, 100, 500, 1000], key="nd_page_size")
+    num_pages = max(1, -(-len(filtered_nd_df) // page_size))
+    with page_col2:
+        page = st.number_input(
+            f"Page (of {num_pages})",
+            min_value=1,
+            max_value=num_pages,
+            value=1,
+            step=1,
+            key="nd_page"
+        )
+    start = (page - 1) * page_size
+    page_df = filtered_nd_df.iloc[start:start + page_size].copy()
+    page_df['year'] = page_df['year'].astype(str)
+    # Display the current page only
+    st.dataframe(page_df, use_container_width=True, hide_index=True)
+    
+    # Create visualization for ND annotations from the pre-aggregated counts
+    chart_counts = year_aspect_counts[
+        year_aspect_counts['aspect'].isin(selected_aspects) &
+        year_aspect_counts['year'].between(min_year_input, max_year_input)
+    ]
+    chart = alt.Chart(chart_counts).mark_bar().encode(
         x=alt.X('year:O', title='Year'),
-        y=alt.Y('count()', title='Number of Proteins'),
+        y=alt.Y('count:Q', title='Number of Proteins'),
         color=alt.Color('aspect:N', title='Aspect')
     ).properties(
         title='ND Annotations by Year and Aspect'
     )
     st.altair_chart(chart, use_container_width=True)
+    
+    st.download_button(
+        label="Download ND Data",
+        data=lambda: build_nd_export(selected_aspects, min_year_input, max_year_input),
+        file_name="nd_proteins.csv",
+        mime="text/csv",
+        on_click="ignore"
+    )
 
 
 def create_checkbox_filter(df, column_name, default_state=True, num_columns=3):
@@ -78,35 +145,19 @@ def create_checkbox_filter(df, column_name, default_state=True, num_columns=3):
     return selected, selected_values
 
 
-def create_aggrid_hover_table(df, unreviewed_dict):
+def create_filter_form(pe_levels, bounds, release_diff=False, duplicates=False):
     """
-    Create an interactive AgGrid table with hover feature, search functionality,
-    and color-coded rows based on protein existence levels
+    Create the publication and protein filter inputs for server-side filtering.
+    The inputs are grouped in a form and only applied on submit.
+    With release_diff, a checkbox restricts the grid to what is new since the last release.
+    With duplicates, a checkbox collapses the clusters of near-duplicate titles.
+    Returns the FilterState set in the form.
     """
-    # First get the set of valid uniprot_ids from the filtered df
-    valid_uniprot_ids = set(df['uniprot_id'].values)
+    # The filters are only applied on submit, so editing several of them costs a single grid update
+    filter_form = st.form("publication_filters", border=False)
     
-    # Helper function to safely extract values, only from valid proteins
-    def safe_get_values(dict_data, valid_ids):
-        all_scores = []
-        all_years = []
-        
-        for key, value in dict_data.items():
-            if key in valid_ids and isinstance(value, pd.DataFrame):
-                all_scores.extend(value['score'].astype(float).tolist())
-                all_years.extend(value['year'].astype(str).tolist())
-                
-        return all_scores, all_years
-
     # Create column layout for filters
-    col1, col2 = st.columns(2)
-    
-    # Get all scores and years safely, only from valid proteins
-    all_scores, all_years = safe_get_values(unreviewed_dict, valid_uniprot_ids)
-    
-    if not all_scores or not all_years:
-        st.error("No valid data found to create filters")
-        return None
+    col1, col2 = filter_form.columns(2)
 
     # # Add score filter input boxes
     # with col1:
@@ -139,17 +190,7 @@ def create_aggrid_hover_table(df, unreviewed_dict):
         st.write("Filter publications by fraction of gene mentions")
         fraction_col1, fraction_col2 = st.columns(2)
         
-        # Calculate min/max fraction_mentions
-        all_fractions = []
-        for key, value in unreviewed_dict.items():
-            if key in valid_uniprot_ids and isinstance(value, pd.DataFrame):
-                all_fractions.extend(value['fraction_mentions'].astype(float).tolist())
-        
-        min_fraction = 0.0
-        max_fraction = 1.0
-        if all_fractions:
-            min_fraction = max(0.0, min(float(f) for f in all_fractions))
-            max_fraction = min(1.0, max(float(f) for f in all_fractions))
+        min_fraction, max_fraction = bounds['fraction']
         
         with fraction_col1:
             min_fraction_input = st.number_input(
@@ -174,8 +215,7 @@ def create_aggrid_hover_table(df, unreviewed_dict):
         st.write("Filter publications by publication year range")
         year_col1, year_col2 = st.columns(2)
         
-        min_year = int(min(int(y) for y in all_years))
-        max_year = int(max(int(y) for y in all_years))
+        min_year, max_year = bounds['year']
         
         with year_col1:
             min_year_input = st.number_input(
@@ -197,20 +237,27 @@ def create_aggrid_hover_table(df, unreviewed_dict):
 
         # Add search box
     
-    col1, col2 = st.columns(2)
+    col1, col2 = filter_form.columns(2)
     with col1:
         search_query = st.text_input(
         "Search proteins (multiple terms separated by comma)",
         help="Enter search terms separated by commas. The search is case-insensitive and matches partial text."
     )
+        new_only = st.checkbox(
+            "Only new since last release",
+            help="Newly unannotated proteins and publications added since the previous snapshot (see release_diff.py)"
+        ) if release_diff else False
+        collapse_duplicates = st.checkbox(
+            "Collapse near-duplicate titles",
+            help="Show one publication per cluster of near-duplicate titles, such as a preprint and its "
+                 "journal version (see title_dedup.py)"
+        ) if duplicates else False
     with col2:
         # Add filter for last reviewed publication year
         st.write("Filter proteins by last reviewed publication year")
         last_reviewed_col1, last_reviewed_col2 = st.columns(2)
         with last_reviewed_col1:
-            
-            min_last_reviewed = int(df['last_reviewed_pubyear'].min())
-            max_last_reviewed = int(df['last_reviewed_pubyear'].max())
+            min_last_reviewed, max_last_reviewed = bounds['last_reviewed']
             
             min_last_reviewed_input = st.number_input(
                 "Minimum last reviewed year",
@@ -227,41 +274,60 @@ def create_aggrid_hover_table(df, unreviewed_dict):
                 value=max_last_reviewed,
                 step=1
             )
+    filter_form.form_submit_button("Apply filters", type="primary")
     
-    # Filter the main DataFrame based on last reviewed publication year
-    df = df.copy()
+    # Filter proteins by last reviewed publication year and publications by
+    # fraction and year cutoffs, then apply the search terms
+    filters = FilterState(
+        pe_levels=pe_levels,
+        min_fraction=min_fraction_input,
+        max_fraction=max_fraction_input,
+        min_year=min_year_input,
+        max_year=max_year_input,
+        min_last_reviewed=min_last_reviewed_input,
+        max_last_reviewed=max_last_reviewed_input,
+        search_query=search_query,
+        new_only=new_only,
+        collapse_duplicates=collapse_duplicates
+    )
+    return filters
 
-    # Handle potential NaN values that might result from the conversion
-    df = df[
-        (df['last_reviewed_pubyear'].notna()) & 
-        (df['last_reviewed_pubyear'] >= min_last_reviewed_input) & 
-        (df['last_reviewed_pubyear'] <= max_last_reviewed_input)
-    ]
-    valid_uniprot_ids = set(df['uniprot_id'].values) # reset valid_uniprot_ids after filtering
-    # Filter unreviewed_dict based on both fraction and year cutoffs
-    filtered_unreviewed_dict = {}
-    
-    for uniprot_id in valid_uniprot_ids:
-        if uniprot_id in unreviewed_dict:
-            data = unreviewed_dict[uniprot_id]
-            if isinstance(data, pd.DataFrame):
-                try:
-                    filtered_data = data[
-                        (data['fraction_mentions'].astype(float) >= min_fraction_input) & 
-                        (data['fraction_mentions'].astype(float) <= max_fraction_input) & 
-                        (data['year'].astype(int) >= min_year_input) & 
-                        (data['year'].astype(int) <= max_year_input)
-                    ]
-                    filtered_unreviewed_dict[uniprot_id] = filtered_data
-                except Exception as e:
-                    st.error(f"Error processing protein {uniprot_id}: {str(e)}")
-                    continue
 
-    # Update num_unreviewed_publications in the main DataFrame
-    df = df.copy()
-    df['num_unreviewed_publications'] = df['uniprot_id'].apply(
-        lambda x: len(filtered_unreviewed_dict.get(x, pd.DataFrame()))
-    )
+def create_aggrid_hover_table(pe_levels, client_side=False):
+    """
+    Create an interactive AgGrid table with hover feature, search functionality,
+    and color-coded rows based on protein existence levels.
+    The proteins with the selected PE levels and their publications are taken
+    from the shared dataset cache.
+    With client_side, the grid receives the unfiltered selection once and the
+    filters run in the browser; otherwise they are applied server-side.
+    Returns the FilterState applied to the grid.
+    """
+    # Get the filter ranges, only from valid proteins
+    bounds = get_filter_bounds(pe_levels)
+    
+    if bounds is None:
+        st.error("No valid data found to create filters")
+        return None
+
+    non_nd_df, store = get_dataset()
+    out_of_core = is_out_of_core()
+    release_diff = NEW_SINCE_RELEASE in non_nd_df.columns
+    if out_of_core:
+        duplicates = store.has_column('publications', 'canonical_pmid')
+    else:
+        duplicates = 'canonical_pmid' in store.publications.columns
+    if client_side:
+        filters = get_default_filters(pe_levels)
+        st.caption("Filters above the grid apply instantly in your browser.")
+    else:
+        filters = create_filter_form(pe_levels, bounds, release_diff, duplicates)
+    
+    try:
+        df, _, (total_filtered_pubs, proteins_with_pubs) = get_grid_view(filters)
+    except Exception as e:
+        st.error(f"Error filtering publications: {str(e)}")
+        return None
 
     # Define color mapping for protein existence levels
     color_map = {
@@ -296,10 +362,9 @@ def create_aggrid_hover_table(df, unreviewed_dict):
             this.eGui = document.createElement('div');
             this.eGui.classList.add('publications-cell');
             this.uniprot_id = params.data ? params.data.uniprot_id : null;
-            
-            const context = params.context || {};
-            const unreviewedDict = context.unreviewedDict || {};
-            this.unreviewedData = this.uniprot_id ? (unreviewedDict[String(this.uniprot_id)] || []) : [];
+            // The count comes with the row (or from the client-side filters); the publications
+            // themselves are only joined when the modal is opened
+            this.count = Number(params.value) || 0;
             
             this.render();
             
@@ -312,12 +377,26 @@ def create_aggrid_hover_table(df, unreviewed_dict):
         }
         
         refresh(params) {
-            this.params = params;
-            return true;
+            // Rebuild the cell, so the publications follow the client-side filters
+            return false;
+        }
+        
+        publications() {
+            // Publications are stored once per PMID; join them with this protein's links
+            const context = this.params.context || {};
+            const publications = context.publications || {};
+            const links = (context.links || {})[String(this.uniprot_id)] || {};
+            const clientFilter = context.client_filters ? window.clientPublicationFilter : null;
+            const pubs = (links.pmid || []).map((pmid, i) => {
+                const pub = Object.assign({}, publications[String(pmid)]);
+                Object.keys(links).forEach(field => { pub[field] = links[field][i]; });
+                return pub;
+            });
+            return clientFilter ? clientFilter.visiblePublications(pubs) : pubs;
         }
         
         render() {
-            if (!this.unreviewedData || this.unreviewedData.length === 0) {
+            if (this.count === 0) {
                 this.eGui.innerHTML = `<span>0</span>`;
                 return;
             }
@@ -326,7 +405,7 @@ def create_aggrid_hover_table(df, unreviewed_dict):
             this.eGui.innerHTML = `
                 <div class="cell-container">
                     <div class="cell-header">
-                        <span>${this.unreviewedData.length}</span>
+                        <span>${this.count}</span>
                         <button class="view-btn" title="Click to view publications">View</button>
                     </div>
                 </div>
@@ -337,8 +416,15 @@ def create_aggrid_hover_table(df, unreviewed_dict):
             // Prevent default grid behavior
             event.stopPropagation();
             
+            // Out of core, the publications are not in the page: select the row so the app shows them
+            if ((this.params.context || {}).server_lookup) {
+                this.params.node.setSelected(true, true);
+                return;
+            }
+            
             // Skip if no data
-            if (!this.unreviewedData || this.unreviewedData.length === 0) {
+            const unreviewedData = this.publications();
+            if (unreviewedData.length === 0) {
                 return;
             }
             
@@ -396,7 +482,7 @@ def create_aggrid_hover_table(df, unreviewed_dict):
                                     </tr>
                                 </thead>
                                 <tbody>
-                                    ${this.unreviewedData.map(pub => `
+                                    ${unreviewedData.map(pub => `
                                         <tr>
                                             <td><a href="https://www.ncbi.nlm.nih.gov/research/pubtator3/publication/${pub.pmid || ''}" target="_blank">${pub.pmid || ''}</a></td>
                                             <td>${pub.year || ''}</td>
@@ -490,42 +576,290 @@ def create_aggrid_hover_table(df, unreviewed_dict):
     }
     """)
     
-    # Apply search filter if search terms exist
-    if search_query:
-        search_terms = [term.strip().lower() for term in search_query.split(',')]
-        mask = df.apply(
-            lambda row: any(
-                any(term in str(value).lower() for value in row)
-                for term in search_terms
-            ),
-            axis=1
-        )
-        df = df[mask]
-    
-    
-    # Convert filtered_unreviewed_dict DataFrames to lists of dicts for JS
-    js_unreviewed_dict = {}
-    for uniprot_id, df_pub in filtered_unreviewed_dict.items():
-        if isinstance(df_pub, pd.DataFrame) and not df_pub.empty:
-            # Convert to list of dictionaries, ensuring values are JSON serializable
-            records = []
-            for _, row in df_pub.iterrows():
-                record = {}
-                for col in df_pub.columns:
-                    value = row[col]
-                    # Convert non-serializable values to strings
-                    if pd.isna(value):
-                        record[col] = None
-                    elif isinstance(value, (int, float, bool, str)):
-                        record[col] = value
-                    else:
-                        record[col] = str(value)
-                records.append(record)
-            js_unreviewed_dict[str(uniprot_id)] = records
-        else:
-            # Ensure we always have at least an empty array for each uniprot_id
-            js_unreviewed_dict[str(uniprot_id)] = []
+    # The payload is shared across sessions: extend a copy with the histogram years and the client-side filters
+    # Server-side, the grid only gets the per-protein summaries: the publications of a
+    # protein are fetched when its View button is clicked
+    if client_side:
+        context = dict(get_publication_payload(filters), summary_years=get_summary_years())
+    else:
+        context = {'server_lookup': True, 'summary_years': get_summary_years()}
+    if client_side:
+        context = dict(context, client_filters={
+            'defaults': {field: value for field, value in filters._asdict().items()
+                         if field not in ('pe_levels', 'search_query')},
+            'release_diff': release_diff,
+            'duplicates': duplicates,
+            'protein_columns': [col for col in PROTEIN_COLUMNS if col in df.columns],
+            'publication_columns': EXPORT_COLUMNS,
+            'summary_columns': SUMMARY_COLUMNS,
+            'top_publications': NUM_TOP_PUBLICATIONS,
+        })
+    client_filter = JsCode("""
+    (function() {
+        const filter = {
+            state: null,
+            defaults: null,
+            api: null,
+            context: null,
+            timer: null,
+            summaries: new Map(),
+            
+            attach(api, context) {
+                this.api = api;
+                this.context = context;
+                this.defaults = context.client_filters.defaults;
+                this.state = Object.assign({search_terms: []}, this.defaults);
+                this.render();
+                this.apply();
+            },
+            
+            passes(fraction, year, isNew) {
+                const s = this.state;
+                return fraction >= s.min_fraction && fraction <= s.max_fraction && year >= s.min_year && year <= s.max_year &&
+                    (!s.new_only || isNew === true);
+            },
             
+            publicationPasses(pub) {
+                return !this.state || this.passes(Number(pub.fraction_mentions), Number(pub.year), pub.new_since_last_release);
+            },
+            
+            collapse(pubs) {
+                // Same as the server: one publication per cluster of near-duplicate titles,
+                // the canonical one when it passes the filters, otherwise the first
+                if (!this.state || !this.state.collapse_duplicates) {
+                    return pubs;
+                }
+                const kept = new Map();
+                pubs.forEach((pub, i) => {
+                    const key = String(pub.canonical_pmid === undefined || pub.canonical_pmid === null ? pub.pmid : pub.canonical_pmid);
+                    if (!kept.has(key) || (String(pub.pmid) === key && String(pubs[kept.get(key)].pmid) !== key)) {
+                        kept.set(key, i);
+                    }
+                });
+                const keep = new Set(kept.values());
+                return pubs.filter((pub, i) => keep.has(i));
+            },
+            
+            visiblePublications(pubs) {
+                return this.collapse(pubs.filter(pub => this.publicationPasses(pub)));
+            },
+            
+            joinPublications(uniprot_id) {
+                const links = (this.context.links || {})[String(uniprot_id)];
+                if (!links) {
+                    return [];
+                }
+                const publications = this.context.publications || {};
+                return links.pmid.map((pmid, i) => {
+                    const pub = Object.assign({}, publications[String(pmid)]);
+                    Object.keys(links).forEach(field => { pub[field] = links[field][i]; });
+                    return pub;
+                });
+            },
+            
+            summary(uniprot_id) {
+                // Same as protein_summaries on the server, over the publications passing the filters
+                const key = String(uniprot_id);
+                if (this.summaries.has(key)) {
+                    return this.summaries.get(key);
+                }
+                const pubs = this.visiblePublications(this.joinPublications(uniprot_id));
+                const summary = {year_histogram: null, max_fraction: null, mean_fraction: null, in_title_count: 0, top_publications: null};
+                if (pubs.length > 0) {
+                    const [firstYear, lastYear] = this.context.summary_years;
+                    summary.year_histogram = new Array(lastYear - firstYear + 1).fill(0);
+                    let total = 0;
+                    summary.max_fraction = -Infinity;
+                    pubs.forEach(pub => {
+                        const fraction = Number(pub.fraction_mentions);
+                        summary.year_histogram[Number(pub.year) - firstYear]++;
+                        summary.max_fraction = Math.max(summary.max_fraction, fraction);
+                        summary.in_title_count += pub.in_title === true ? 1 : 0;
+                        total += fraction;
+                    });
+                    summary.mean_fraction = total / pubs.length;
+                    // in_title first, then highest fraction, most recent year and smallest PMID
+                    summary.top_publications = pubs.slice().sort((a, b) =>
+                        (b.in_title === true) - (a.in_title === true) ||
+                        Number(b.fraction_mentions) - Number(a.fraction_mentions) ||
+                        Number(b.year) - Number(a.year) ||
+                        Number(a.pmid) - Number(b.pmid)
+                    ).slice(0, this.context.client_filters.top_publications).map(pub => ({
+                        pmid: Number(pub.pmid),
+                        year: Number(pub.year),
+                        fraction_mentions: Number(pub.fraction_mentions),
+                        in_title: pub.in_title === true,
+                        title: pub.title === undefined ? null : pub.title,
+                    }));
+                }
+                this.summaries.set(key, summary);
+                return summary;
+            },
+            
+            count(uniprot_id) {
+                const links = (this.context.links || {})[String(uniprot_id)];
+                if (!links) {
+                    return 0;
+                }
+                const publications = this.context.publications || {};
+                const clusters = this.state.collapse_duplicates ? new Set() : null;
+                let count = 0;
+                for (let i = 0; i < links.pmid.length; i++) {
+                    const pub = publications[String(links.pmid[i])] || {};
+                    const isNew = links.new_since_last_release ? links.new_since_last_release[i] : false;
+                    if (this.passes(Number(links.fraction_mentions[i]), Number(pub.year), isNew)) {
+                        if (clusters) {
+                            clusters.add(String(pub.canonical_pmid === undefined || pub.canonical_pmid === null ? links.pmid[i] : pub.canonical_pmid));
+                        } else {
+                            count++;
+                        }
+                    }
+                }
+                return clusters ? clusters.size : count;
+            },
+            
+            rowPasses(data) {
+                const s = this.state;
+                const lastReviewed = data.last_reviewed_pubyear;
+                if (lastReviewed === null || lastReviewed === undefined || Number.isNaN(lastReviewed) ||
+                    lastReviewed < s.min_last_reviewed || lastReviewed > s.max_last_reviewed) {
+                    return false;
+                }
+                // Same as the server: newly unannotated proteins and those with new publications
+                if (s.new_only && data.new_since_last_release !== true && this.count(data.uniprot_id) === 0) {
+                    return false;
+                }
+                if (s.search_terms.length === 0) {
+                    return true;
+                }
+                // Same semantics as the server-side search: any column contains any term
+                // (the summary columns are added after the server-side search)
+                const summaryColumns = this.context.client_filters.summary_columns;
+                const values = Object.keys(data).filter(
+                    key => key !== '__pandas_index' && !summaryColumns.includes(key)
+                ).map(key => String(
+                    key === 'num_unreviewed_publications' ? this.count(data.uniprot_id) : data[key]
+                ).toLowerCase());
+                return s.search_terms.some(term => values.some(value => value.includes(term)));
+            },
+            
+            render() {
+                const existing = document.getElementById('client-filter-bar');
+                if (existing) {
+                    existing.remove();
+                }
+                const s = this.state;
+                const range = (label, minField, maxField, step, min, max) => `
+                    <div class="client-filter-group">
+                        <span>${label}</span>
+                        <input type="number" data-field="${minField}" value="${s[minField]}" step="${step}" min="${min}" max="${max}">
+                        <span>to</span>
+                        <input type="number" data-field="${maxField}" value="${s[maxField]}" step="${step}" min="${min}" max="${max}">
+                    </div>`;
+                const bar = document.createElement('div');
+                bar.id = 'client-filter-bar';
+                bar.className = 'client-filter-bar';
+                bar.innerHTML = `
+                    ${range('Fraction of gene mentions', 'min_fraction', 'max_fraction', 0.01, 0, 1)}
+                    ${range('Publication year', 'min_year', 'max_year', 1, this.defaults.min_year, this.defaults.max_year)}
+                    ${range('Last reviewed year', 'min_last_reviewed', 'max_last_reviewed', 1,
+                            this.defaults.min_last_reviewed, this.defaults.max_last_reviewed)}
+                    <input type="text" class="client-filter-search" placeholder="Search proteins (multiple terms separated by comma)">
+                    ${this.context.client_filters.release_diff ? `
+                    <label class="client-filter-group">
+                        <input type="checkbox" class="client-filter-new" ${s.new_only ? 'checked' : ''}>
+                        <span>Only new since last release</span>
+                    </label>` : ''}
+                    ${this.context.client_filters.duplicates ? `
+                    <label class="client-filter-group">
+                        <input type="checkbox" class="client-filter-collapse" ${s.collapse_duplicates ? 'checked' : ''}>
+                        <span>Collapse near-duplicate titles</span>
+                    </label>` : ''}
+                    <span class="client-filter-summary"></span>
+                    <button type="button" class="client-filter-download">Download TSV</button>`;
+                const container = document.getElementById('gridContainer') || document.body;
+                container.insertBefore(bar, container.firstChild);
+                
+                // Debounce typing, then filter without a round trip to the server
+                bar.addEventListener('input', () => {
+                    clearTimeout(this.timer);
+                    this.timer = setTimeout(() => this.read(bar), 150);
+                });
+                bar.querySelector('.client-filter-download').addEventListener('click', () => this.download());
+            },
+            
+            read(bar) {
+                const state = Object.assign({}, this.state);
+                bar.querySelectorAll('input[type=number]').forEach(input => {
+                    const value = parseFloat(input.value);
+                    state[input.dataset.field] = Number.isNaN(value) ? this.defaults[input.dataset.field] : value;
+                });
+                const newOnly = bar.querySelector('.client-filter-new');
+                state.new_only = newOnly ? newOnly.checked : false;
+                const collapse = bar.querySelector('.client-filter-collapse');
+                state.collapse_duplicates = collapse ? collapse.checked : false;
+                const query = bar.querySelector('.client-filter-search').value;
+                state.search_terms = query ? query.split(',').map(term => term.trim().toLowerCase()) : [];
+                this.state = state;
+                this.summaries = new Map();
+                this.apply();
+            },
+            
+            apply() {
+                this.api.onFilterChanged();
+                this.api.refreshCells({
+                    columns: ['num_unreviewed_publications'].concat(this.context.client_filters.summary_columns),
+                    force: true
+                });
+                let publications = 0;
+                let proteins = 0;
+                this.api.forEachNodeAfterFilter(node => {
+                    const count = this.count(node.data.uniprot_id);
+                    publications += count;
+                    proteins += count > 0 ? 1 : 0;
+                });
+                const summary = document.querySelector('#client-filter-bar .client-filter-summary');
+                summary.textContent = `${publications} publications meeting criteria, ${proteins} proteins with matching publications`;
+            },
+            
+            download() {
+                // Same layout as the server-side TSV export: one row per protein and publication
+                const filters = this.context.client_filters;
+                const columns = filters.protein_columns.concat(filters.publication_columns);
+                const format = (value, column) => {
+                    if (value === null || value === undefined) {
+                        return '';
+                    }
+                    if (typeof value === 'boolean') {
+                        return value ? 'True' : 'False';
+                    }
+                    if (column === 'fraction_mentions' && Number.isInteger(value)) {
+                        return value.toFixed(1);
+                    }
+                    return String(value).replace(/[\\t\\n\\r]+/g, ' ');
+                };
+                const lines = [columns.join('\\t')];
+                this.api.forEachNodeAfterFilterAndSort(node => {
+                    this.visiblePublications(this.joinPublications(node.data.uniprot_id)).forEach(pub => {
+                        lines.push(columns.map(column => format(column in pub ? pub[column] : node.data[column], column)).join('\\t'));
+                    });
+                });
+                const link = document.createElement('a');
+                link.href = URL.createObjectURL(new Blob([lines.join('\\n') + '\\n'], {type: 'text/tab-separated-values'}));
+                link.download = 'potential_pubs.tsv';
+                document.body.appendChild(link);
+                link.click();
+                link.remove();
+                setTimeout(() => URL.revokeObjectURL(link.href), 1000);
+            }
+        };
+        window.clientPublicationFilter = filter;
+        return function() {
+            return filter.state !== null;
+        };
+    })()
+    """)
+    
     # Build grid options
     gb = GridOptionsBuilder.from_dataframe(df)
     
@@ -567,6 +901,75 @@ def create_aggrid_hover_table(df, unreviewed_dict):
         cellStyle={"cursor": "pointer"}
     )
     
+    # Overview columns from the per-protein summaries
+    sparkline_renderer = JsCode("""
+    class SparklineRenderer {
+        init(params) {
+            this.eGui = document.createElement('div');
+            this.eGui.classList.add('sparkline-cell');
+            const counts = params.value ? Array.from(params.value) : [];
+            const peak = Math.max(0, ...counts);
+            if (peak === 0) {
+                return;
+            }
+            // One bar per publication year, scaled to the busiest year of the protein
+            const [firstYear, lastYear] = (params.context || {}).summary_years || [0, counts.length - 1];
+            const width = 100 / counts.length;
+            const bars = counts.map((count, i) => count === 0 ? '' :
+                `<rect x="${i * width}" y="${24 * (1 - count / peak)}" width="${width * 0.8}" height="${24 * count / peak}"></rect>`
+            ).join('');
+            this.eGui.innerHTML = `
+                <svg viewBox="0 0 100 24" preserveAspectRatio="none">
+                    <title>Publications per year, ${firstYear}-${lastYear} (max ${peak})</title>
+                    ${bars}
+                </svg>`;
+        }
+        
+        getGui() {
+            return this.eGui;
+        }
+        
+        refresh(params) {
+            return false;
+        }
+    }
+    """)
+    gb.configure_column(
+        'year_histogram',
+        headerName='Publications per Year',
+        headerTooltip="Unreviewed publications per year, from the first to the last publication year of the dataset",
+        cellRenderer='SparklineRenderer',
+        sortable=False,
+        filter=False,
+        minWidth=140
+    )
+    fraction_formatter = JsCode("""
+    function(params) {
+        return params.value === null || params.value === undefined ? '' : Number(params.value).toFixed(3);
+    }
+    """)
+    gb.configure_column(
+        'max_fraction',
+        headerName='Max Fraction',
+        headerTooltip="Highest fraction of gene mentions among the unreviewed publications",
+        valueFormatter=fraction_formatter
+    )
+    gb.configure_column(
+        'mean_fraction',
+        headerName='Mean Fraction',
+        headerTooltip="Mean fraction of gene mentions over the unreviewed publications",
+        valueFormatter=fraction_formatter
+    )
+    gb.configure_column(
+        'in_title_count',
+        headerName='In Title',
+        headerTooltip="Number of unreviewed publications mentioning the protein in their title"
+    )
+    gb.configure_column(
+        'top_publications',
+        hide=True
+    )
+    
     # Update the tooltip to match the modal approach (around line 640-680)
     custom_tooltip = JsCode("""
     class CustomTooltip {
@@ -581,36 +984,41 @@ def create_aggrid_hover_table(df, unreviewed_dict):
                     return;
                 }
                 
-                const unreviewedData = params.context && params.context.unreviewedDict ? 
-                    params.context.unreviewedDict[String(uniprot_id)] || [] : [];
+                // The preview only needs the summary of the protein, not its publications
+                const clientFilter = (params.context || {}).client_filters ? window.clientPublicationFilter : null;
+                const filtered = clientFilter && clientFilter.state;
+                const summary = filtered ? clientFilter.summary(uniprot_id) : params.data;
+                const count = filtered ? clientFilter.count(uniprot_id) : params.data.num_unreviewed_publications;
+                const topPublications = summary.top_publications || [];
                 
-                if (!unreviewedData || unreviewedData.length === 0) {
+                if (!count || topPublications.length === 0) {
                     this.eGui.innerHTML = 'No publications found';
                 } else {
-                    const previewCount = Math.min(unreviewedData.length, 5);
-                    const previewData = unreviewedData.slice(0, previewCount);
-                    
                     this.eGui.innerHTML = `
                         <div>
                             <p style="margin-bottom: 8px; font-weight: bold;">
-                                ${unreviewedData.length} publication(s) - Preview:
+                                ${count} publication(s) - Top ${topPublications.length} by priority:
                             </p>
                             <table style="border-collapse: collapse; width: 100%; margin-bottom: 8px;">
                                 <tr style="background-color: #f0f0f0;">
                                     <th style="padding: 4px; border: 1px solid #ddd;">PMID</th>
                                     <th style="padding: 4px; border: 1px solid #ddd;">Year</th>
                                     <th style="padding: 4px; border: 1px solid #ddd;">Fraction</th>
+                                    <th style="padding: 4px; border: 1px solid #ddd;">In Title</th>
+                                    <th style="padding: 4px; border: 1px solid #ddd;">Title</th>
                                 </tr>
-                                ${previewData.map(pub => `
+                                ${topPublications.map(pub => `
                                     <tr>
                                         <td style="padding: 4px; border: 1px solid #ddd;">${pub.pmid || ''}</td>
                                         <td style="padding: 4px; border: 1px solid #ddd;">${pub.year || ''}</td>
                                         <td style="padding: 4px; border: 1px solid #ddd;">${pub.fraction_mentions ? Number(pub.fraction_mentions).toFixed(2) : ''}</td>
+                                        <td style="padding: 4px; border: 1px solid #ddd;">${pub.in_title ? 'Yes' : 'No'}</td>
+                                        <td style="padding: 4px; border: 1px solid #ddd;">${pub.title || ''}</td>
                                     </tr>
                                 `).join('')}
                             </table>
                             <p style="color: #666; font-size: 0.9em; margin: 0;">
-                                Click to view all publications in fullscreen modal
+                                Click View to see all publications
                             </p>
                         </div>
                     `;
@@ -630,11 +1038,12 @@ def create_aggrid_hover_table(df, unreviewed_dict):
     gb.configure_grid_options(
         tooltipShowDelay=0,
         tooltipHideDelay=2000,
-        context={'unreviewedDict': js_unreviewed_dict},
+        context=context,
         tooltipComponent='CustomTooltip',
         components={
             'CustomTooltip': custom_tooltip,
-            'PublicationsRenderer': cell_renderer
+            'PublicationsRenderer': cell_renderer,
+            'SparklineRenderer': sparkline_renderer
         },
         getRowStyle=row_style,
         suppressClickEdit=True,
@@ -650,6 +1059,45 @@ def create_aggrid_hover_table(df, unreviewed_dict):
         paginationAutoPageSize=False,
         rowHeight=42
     )
+    if not client_side:
+        # Rows are only selected by the View button of the publications column
+        gb.configure_selection('single', suppressRowClickSelection=True)
+
+    if client_side:
+        # Filter rows and recount publications in the browser from the filter bar values
+        gb.configure_column(
+            'num_unreviewed_publications',
+            valueGetter=JsCode("""
+            function(params) {
+                const filter = window.clientPublicationFilter;
+                return filter && filter.state ? filter.count(params.data.uniprot_id) : params.data.num_unreviewed_publications;
+            }
+            """)
+        )
+        # The summary columns follow the filter bar as well
+        for column in SUMMARY_COLUMNS:
+            gb.configure_column(
+                column,
+                valueGetter=JsCode(f"""
+                function(params) {{
+                    const filter = window.clientPublicationFilter;
+                    return filter && filter.state ? filter.summary(params.data.uniprot_id).{column} : params.data.{column};
+                }}
+                """)
+            )
+        gb.configure_grid_options(
+            isExternalFilterPresent=client_filter,
+            doesExternalFilterPass=JsCode("""
+            function(node) {
+                return window.clientPublicationFilter.rowPasses(node.data);
+            }
+            """),
+            onFirstDataRendered=JsCode("""
+            function(params) {
+                window.clientPublicationFilter.attach(params.api, params.context);
+            }
+            """)
+        )
 
     # Get the grid options from the builder
     grid_options = gb.build()
@@ -672,6 +1120,16 @@ def create_aggrid_hover_table(df, unreviewed_dict):
             "z-index": "9999",
             "cursor": "default"
         },
+        ".sparkline-cell": {
+            "display": "flex",
+            "align-items": "center",
+            "height": "100%"
+        },
+        ".sparkline-cell svg": {
+            "width": "100%",
+            "height": "24px",
+            "fill": "#3366cc"
+        },
         ".publications-cell": {
             "width": "100%",
             "cursor": "pointer"
@@ -851,6 +1309,30 @@ def create_aggrid_hover_table(df, unreviewed_dict):
             "overflow-y": "auto",
         }
     })
+    if client_side:
+        # Stack the filter bar above the grid within the grid container
+        custom_css.update({
+            "#gridContainer": {"display": "flex", "flex-direction": "column"},
+            "#gridContainer > div:last-child": {"flex": "1 1 auto", "min-height": "0"},
+            ".client-filter-bar": {
+                "display": "flex",
+                "flex-wrap": "wrap",
+                "align-items": "center",
+                "gap": "8px 16px",
+                "padding": "4px 0 8px 0",
+                "font-family": "sans-serif",
+                "font-size": "13px"
+            },
+            ".client-filter-group": {
+                "display": "flex",
+                "align-items": "center",
+                "gap": "4px"
+            },
+            ".client-filter-group input": {"width": "80px", "padding": "3px"},
+            ".client-filter-search": {"width": "280px", "padding": "4px"},
+            ".client-filter-summary": {"color": "#666"},
+            ".client-filter-download": {"padding": "4px 10px", "cursor": "pointer"}
+        })
     
     try:
         # Display summary metrics in columns
@@ -862,61 +1344,117 @@ def create_aggrid_hover_table(df, unreviewed_dict):
             gridOptions=grid_options,
             allow_unsafe_jscode=True,
             custom_css=custom_css,
-            height=600,  # Increase height to better accommodate expanded rows
+            height=680 if client_side else 600,  # Increase height to better accommodate expanded rows
             fit_columns_on_grid_load=True,
             theme="streamlit",
-            update_mode='value_changed',
+            update_mode='value_changed' if client_side else 'selection_changed',
             data_return_mode='filtered_and_sorted',
             reload_data=True,  # Force reload data
             enable_enterprise_modules=False,
-            key=f"grid_{len(df)}",  # Dynamic key based on data size
+            key=f"{'client_' if client_side else ''}grid_{len(df)}",  # Dynamic key based on data size
         )
         
-        # Display summary statistics
-        total_filtered_pubs = sum(len(pubs) for pubs in filtered_unreviewed_dict.values())
-        proteins_with_pubs = sum(1 for pubs in filtered_unreviewed_dict.values() if len(pubs) > 0)
-        
-        with col1:
-            st.metric("Total publications meeting criteria", total_filtered_pubs)
-        with col2:
-            st.metric("Proteins with matching publications", proteins_with_pubs)
+        if not client_side:
+            show_selected_publications(grid_response.selected_rows, filters)
+
+        # Display summary statistics (shown in the filter bar in client-side mode)
+        if not client_side:
+            with col1:
+                st.metric("Total publications meeting criteria", total_filtered_pubs)
+            with col2:
+                st.metric("Proteins with matching publications", proteins_with_pubs)
         
-        return grid_response
+        return filters
         
     except Exception as e:
         st.error(f"Error displaying grid: {str(e)}")
         st.write("Falling back to standard dataframe display")
         st.dataframe(df)
-        return None
+        return filters
         # TODO: doesn't work with dark mode
 
 
-def create_download_link(uniprot_id, filtered_unreviewed_dict):
-    """Create a download link for a specific protein's publications data"""
-    if uniprot_id in filtered_unreviewed_dict:
-        df = filtered_unreviewed_dict[uniprot_id]
-        csv = df.to_csv(index=False,sep="\t")
-        b64 = base64.b64encode(csv.encode()).decode()
-        href = f'data:file/tsv;base64,{b64}'
-        return href
-    return None
+def show_selected_publications(selected_rows, filters):
+    """
+    With server-side filtering, the grid has no publications to show in its modal: the View
+    button selects the row instead, and the publications of the selected protein are
+    fetched from the dataset and listed below the grid.
+    """
+    if selected_rows is None or selected_rows.empty:
+        st.caption("Click View in the publications column to list the publications of a protein.")
+        return
+    protein = selected_rows.iloc[0]
+    pubs = get_protein_publications(protein['uniprot_id'], filters)
+    st.subheader(f"Publications for {protein.get('gene_name', 'Unknown')} "
+                 f"(UniProt: {protein['uniprot_id']}, NCBI Gene: {protein.get('ncbi_gene', 'Unknown')})")
+    pubs = pubs.sort_values('year', ascending=False, kind='stable').assign(
+        pmid=lambda pubs: "https://www.ncbi.nlm.nih.gov/research/pubtator3/publication/" + pubs['pmid'].astype(str)
+    )
+    columns = [col for col in ['pmid', 'year', 'in_title', 'fraction_mentions', 'total_genes', 'journal',
+                               'full_text', 'title'] if col in pubs.columns]
+    st.dataframe(
+        pubs[columns],
+        use_container_width=True,
+        hide_index=True,
+        column_config={
+            'pmid': st.column_config.LinkColumn("PMID", display_text=r"publication/(\d+)"),
+            'year': st.column_config.NumberColumn("Year", format="%d"),
+            'in_title': "In Title",
+            'fraction_mentions': st.column_config.NumberColumn("Fraction", format="%.2f"),
+            'total_genes': "Total Genes",
+            'journal': "Journal",
+            'full_text': "Full Text",
+            'title': "Title",
+        }
+    )
+
+
+@st.fragment
+def display_export_section(filters, client_side=False):
+    """
+    Display a download button for the filtered proteins and their filtered publications.
+    The file is only generated when the button is clicked, and cached per filter state.
+    Changing the export format only reruns this section.
+    With client_side, the filter bar values stay in the browser: the export uses the default filters,
+    and the button label says so.
+    """
+    st.write("Download the filtered proteins and their publications")
+    if not can_export(filters):
+        st.info(f"This selection has more than {EXPORT_MAX_LINKS:,} publications, the limit of downloads from the app. "
+                "Narrow the filters, or export the dataset from the command line with "
+                "`python biocurator_export.py --sqlite <dataset.sqlite>`.")
+        return
+    if client_side:
+        st.caption("This export uses the default filters of the selected PE levels. "
+                   "To download the rows currently shown with the filter bar values, use its Download TSV button.")
+    format_col, button_col = st.columns([1, 3])
+    with format_col:
+        export_format = st.selectbox(
+            "Export format",
+            list(EXPORT_FORMATS),
+            help="TSV and Parquet contain one row per publication (as in potential_pubs.tsv). "
+                 "ZIP bundles the proteins table and the publications table."
+        )
+    file_name, mime = EXPORT_FORMATS[export_format]
+    with button_col:
+        st.download_button(
+            label="Download Data (default filters)" if client_side else "Download Data",
+            data=lambda: build_export(export_format, filters),
+            file_name=file_name,
+            mime=mime,
+            on_click="ignore"
+        )
 
     
-def display_non_nd_data(non_nd_df, unreviewed_dict):
+def display_non_nd_data(non_nd_df):
     """Display non-ND proteins information"""
     st.header("Proteins without GO Annotations")
     
     # Show total number of non-ND proteins
     st.metric("Total Proteins", len(non_nd_df))
     
-    # Format last reviewed publication year
-    non_nd_df['last_reviewed_pubyear'] = non_nd_df['last_reviewed_pubyear'].apply(
-lambda x: (int(x)) if not pd.isnull(x) else x
-)
-    
-    # Display protein evidence level distribution
-    evidence_dist = non_nd_df['protein_existence'].value_counts()
-    evidence_dist = evidence_dist.reset_index().rename(columns={'count': 'Count', 'protein_existence': 'Protein Existence Level (PE)'})
+    # Display protein evidence level distribution, aggregated server-side
+    evidence_dist = get_pe_counts()
     evidence_chart = alt.Chart(
         evidence_dist
     ).mark_bar().encode(
@@ -929,6 +1467,16 @@ lambda x: (int(x)) if not pd.isnull(x) else x
     )
     st.altair_chart(evidence_chart, use_container_width=True)
     
+    display_publication_grid(non_nd_df)
+
+
+@st.fragment
+def display_publication_grid(non_nd_df):
+    """
+    Display the PE level filter, the publication filters, the grid and the export section.
+    Runs as a fragment: interacting with it only reruns this part of the page,
+    not the chart above or the column descriptions below.
+    """
     # Create filters for protein existence levels
     selected_levels, selected_existence = create_checkbox_filter(
         non_nd_df,
@@ -941,7 +1489,13 @@ lambda x: (int(x)) if not pd.isnull(x) else x
     st.metric("Proteins with Selected PE Level", len(filtered_df)) 
     
     # Display protein information with interactive grid
-    create_aggrid_hover_table(filtered_df, unreviewed_dict)
+    pe_levels = tuple(selected_levels)
+    client_side = use_client_filtering(pe_levels)
+    filters = create_aggrid_hover_table(pe_levels, client_side)
+    
+    # Add download button for the filtered data (the filter bar also has its own in client-side mode)
+    if filters is not None:
+        display_export_section(filters, client_side)
     
     
 def main():
@@ -950,42 +1504,19 @@ def main():
         # Load your pre-processed dataframes here
         # nd_data = pd.read_csv('ND_proteins_112724.tsv',sep="\t",header=0)  
         # non_nd_info_df = pd.read_csv('non_ND_proteins_112724.tsv',sep="\t",header=0)  
-        (non_nd_df, unreviewed_dict) = cp.load(open(PUBTATOR_PICKLE, "rb"))
-        new_unreviewed_dict = {}
-        # Remove unreviewed publications before last_reviewed_pubyear
-        for uniprot_id, data in unreviewed_dict.items():
-            last_reviewed_year = non_nd_df.loc[non_nd_df['uniprot_id'] == uniprot_id, 'last_reviewed_pubyear'].iloc[0]
-            if pd.isna(last_reviewed_year):
-                last_reviewed_year = 0
-            data = data[data['year'].astype(int) > last_reviewed_year]
-            new_unreviewed_dict[uniprot_id] = data
+        (non_nd_df, _) = get_dataset()
         # Create tabs
         tab1, tab2 = st.tabs(["Proteins with No Annotations", "Other Proteins"])
         
         # Display non-ND proteins in the first tab        
         with tab1:
-            display_non_nd_data(non_nd_df, new_unreviewed_dict)
-            
-            # Add download button for non-ND data
-            csv_non_nd = non_nd_df.to_csv(index=False)
-            st.download_button(
-                label="Download Data",
-                data=csv_non_nd,
-                file_name="non_nd_proteins.csv",
-                mime="text/csv"
-            )
+            display_non_nd_data(non_nd_df)
 
-        # Placeholder for future ND proteins tab functionality
-        # with tab2:
-        #     display_nd_data(nd_data)
-            
-        #     csv_nd = nd_data.to_csv(index=False)
-        #     st.download_button(
-        #         label="Download ND Data",
-        #         data=csv_nd,
-        #         file_name="nd_proteins.csv",
-        #         mime="text/csv"
-        #     )
+        with tab2:
+            if os.path.exists(ND_PROTEINS_TSV):
+                display_nd_data(get_nd_dataset(), get_nd_year_aspect_counts())
+            else:
+                st.info(f"No ND annotations found at {ND_PROTEINS_TSV}")
         st.text("Column descriptions:")
         # Display column description table from markdown format
         st.markdown("""
@@ -996,8 +1527,15 @@ def main():
 | `ncbi_gene` | NCBI Gene ID for the protein (from SwissProt dat file)|
 | `last_reviewed_pubyear` | Year of the last reviewed publication (by UniProt) for the protein |
 | `ambiguous_mapping` | Checkbox indicating if the protein has ambiguous mapping to a gene (if a gene has    more than 1000 associated PubTator publications) |
+| `ambiguity_score` | Share of PubTator publications mentioning the protein's symbol or aliases that are mapped to other genes (0-1, approximate; only shown when `alias_ambiguity.py` has been run) |
+| `ambiguous_aliases` | Symbols/aliases of the protein that PubTator maps to many different genes |
+| `new_since_last_release` | Whether the protein became unannotated since the previous snapshot (only shown when `release_diff.py` has been run) |
 | `gene_description` | Functional description of the gene/protein (from NCBI Gene Summary)|
 | `Unreviewed Publications` | Number of unreviewed publications for the protein (from PubTator) |
+| `Publications per Year` | Sparkline of the number of unreviewed publications per year, from the first to the last publication year of the dataset |
+| `Max Fraction`, `Mean Fraction` | Highest and mean `fraction_mentions` of the unreviewed publications |
+| `In Title` | Number of unreviewed publications mentioning the gene/protein in their title |
+| | Hovering over an Unreviewed Publications cell previews the top 3 publications: mentioned in the title first, then by highest fraction and most recent year |
 | | The following columns can be viewed by clicking on the "View" button in each Unreviewed Publications cell |
 | `gene_aliases` | Alternative names/symbols for the gene, comma-separated (from NCBI Gene Summary). These aliases are used in PubTator, so false positives might stem from gene aliases|
 | `pmid` | PubMed ID of the publication |
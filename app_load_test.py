@@ -0,0 +1,445 @@
+"""
+Concurrent-session load test for the Streamlit app.
+
+Opens browser-like websocket sessions and replays scripted curator sessions
+concurrently: toggling PE levels, moving the fraction and year ranges, searching
+and opening the publications of a protein, with a think time between interactions.
+Each interaction is sent the way the browser sends it (widget states, form submits,
+component values and fragment reruns), and the harness reports, per interaction type, p50/p95/p99 rerun latency and
+the bytes received, plus the RSS of the server processes.
+
+By default it runs entirely offline: it generates a synthetic dataset, starts
+a local server on it and stops the server at the end:
+
+    python app_load_test.py --sessions 50 --duration 60 --proteins 2000 --publications 40
+
+It can also target a running app (a single `streamlit run`, run_app.py or the
+serve_multi.py proxy). Pass the server process IDs to report their memory:
+
+    python app_load_test.py --url http://127.0.0.1:8501 --sessions 16 --server-pid 1234
+
+With server-side filtering, clicking View in the publications column selects the
+grid row, and the server lists the publications of the protein: open_modal sends
+that selection the way the grid component does. With client-side filtering (see
+CLIENT_FILTER_MAX_LINKS), the modal and the filters run in the browser and never
+reach the server. Those interactions, and any other whose widgets are not on the
+page, are reported as skipped.
+"""
+import argparse
+import asyncio
+import json
+import os
+import pickle as cp
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from collections import defaultdict, namedtuple
+
+import numpy as np
+import pandas as pd
+from streamlit.proto.BackMsg_pb2 import BackMsg
+from streamlit.proto.ForwardMsg_pb2 import ForwardMsg
+from streamlit.proto.NumberInput_pb2 import NumberInput
+from tornado.httpclient import HTTPRequest
+from tornado.websocket import websocket_connect
+
+from biocurator_data import ARROW_DATASET_ENV
+from pubtator_ingest import PUBLICATION_TABLE_COLUMNS
+from serve_multi import RUN_APP, memory_usage, prepare_arrow_dataset, wait_until_healthy
+
+MAX_MESSAGE_SIZE = 1 << 30
+WIDGET_TYPES = {'checkbox', 'number_input', 'text_input', 'button', 'component_instance'}
+# Name of the st_aggrid component, the key of the grid in AppSession.widgets
+GRID_COMPONENT = 'st_aggrid.agGrid'
+# Words of the synthetic gene descriptions, also used as search terms
+DESCRIPTION_WORDS = ['kinase', 'zinc finger', 'transporter', 'receptor', 'ankyrin repeat',
+                     'coiled-coil domain', 'transmembrane protein', 'open reading frame']
+SUBMIT_LABEL = "Apply filters"
+INTERACTIONS = ['toggle_pe', 'fraction_range', 'year_range', 'search', 'open_modal']
+
+# A widget on the page: its element type, its proto and the fragment it belongs to ('' for none)
+Widget = namedtuple('Widget', ['type', 'proto', 'fragment'])
+
+
+def make_synthetic_dataset(num_proteins=2000, publications_per_protein=40, seed=0):
+    """
+    Random proteins and unreviewed publications in the (non_nd_df, unreviewed_dict) layout
+    of the pubtator pickle. Publications are drawn from a shared PMID pool, so that
+    proteins share publications as they do in PubTator.
+    """
+    rng = np.random.default_rng(seed)
+    uniprot_ids = [f"SYN{i:06d}" for i in range(num_proteins)]
+    last_reviewed = rng.integers(1995, 2021, num_proteins)
+    num_pubs = np.minimum(rng.geometric(1 / publications_per_protein, num_proteins), 50 * publications_per_protein)
+    words = rng.choice(DESCRIPTION_WORDS, num_proteins)
+    non_nd_df = pd.DataFrame({
+        'uniprot_id': uniprot_ids,
+        'gene_name': [f"SYN{i} {{ECO:0000312|HGNC:HGNC:{i}}}" for i in range(num_proteins)],
+        'ncbi_gene': [str(100000 + i) for i in range(num_proteins)],
+        'reviewed_publications': [f"['{pmid}']" for pmid in rng.integers(1_000_000, 9_000_000, num_proteins)],
+        'last_reviewed_pubyear': last_reviewed.astype(float),
+        'protein_existence': rng.choice([1, 2, 3, 4, 5], num_proteins, p=[0.5, 0.3, 0.1, 0.05, 0.05]),
+        'num_unreviewed_publications': num_pubs,
+        'ambiguous_mapping': num_pubs > 1000,
+        'num_total_PubTator': (num_pubs + 1).astype(float),
+        'gene_description': [f"{word} {i % 97}" for i, word in enumerate(words)],
+        'gene_aliases': [f"SYNA{i}, SYNB{i}" for i in range(num_proteins)],
+    })
+
+    pool_size = max(num_pubs.sum() // 3, 1)
+    pool_years = rng.integers(1995, 2026, pool_size)
+    journals = [f"Journal of Synthetic Biology {i}" for i in range(200)]
+    pool = pd.DataFrame({
+        'pmid': np.arange(10_000_000, 10_000_000 + pool_size).astype(str),
+        'year': pool_years.astype(str),
+        'total_genes': rng.integers(1, 30, pool_size),
+        'journal': rng.choice(journals, pool_size),
+        'full_text': rng.random(pool_size) < 0.3,
+        'title': [f"Synthetic study {i} of {word}" for i, word in enumerate(rng.choice(DESCRIPTION_WORDS, pool_size))],
+    })
+    unreviewed_dict = {}
+    for uniprot_id, count in zip(uniprot_ids, num_pubs):
+        pubs = pool.iloc[rng.choice(pool_size, min(count, pool_size), replace=False)].reset_index(drop=True)
+        pubs['in_title'] = rng.random(len(pubs)) < 0.1
+        pubs['fraction_mentions'] = np.round(rng.beta(1, 3, len(pubs)), 4)
+        pubs['score'] = np.round(rng.random(len(pubs)) * 300, 2)
+        unreviewed_dict[uniprot_id] = pubs.sort_values('fraction_mentions', ascending=False)[
+            PUBLICATION_TABLE_COLUMNS + ['score']
+        ].reset_index(drop=True)
+    return non_nd_df, unreviewed_dict
+
+
+class AppSession:
+    """
+    One browser session: a websocket to /_stcore/stream, the messages it has cached
+    and the widgets currently on the page, by label
+    """
+
+    def __init__(self, url):
+        self.url = url.rstrip('/').replace('http://', 'ws://').replace('https://', 'wss://') + '/_stcore/stream'
+        self.conn = None
+        # Widgets carried by cacheable messages, by message hash, to be restored on a ref_hash
+        self.cached_widgets = {}
+        self.widgets = {}
+        self.values = {}
+
+    async def connect(self):
+        self.conn = await websocket_connect(
+            HTTPRequest(self.url), subprotocols=["streamlit"], max_message_size=MAX_MESSAGE_SIZE
+        )
+
+    def widget(self, label):
+        return self.widgets.get(label)
+
+    def value(self, label):
+        return self.values[self.widgets[label].proto.id][1]
+
+    def set_value(self, label, value):
+        """Change a widget value in the browser, without rerunning (like editing a form input)"""
+        widget = self.widgets[label]
+        self.values[widget.proto.id] = (widget, value)
+
+    def _add_widget(self, widget):
+        # Components have no label: they are found by their name
+        self.widgets[widget.proto.component_name if widget.type == 'component_instance' else widget.proto.label] = widget
+        # Like the browser, keep the values of widgets it already knows across reruns.
+        # A component has no value until the browser sets one.
+        if widget.type in ('button', 'component_instance') or widget.proto.id in self.values:
+            return
+        if widget.type != 'number_input' or widget.proto.HasField('default'):
+            self.values[widget.proto.id] = (widget, widget.proto.default)
+
+    def _widget_states(self, trigger=None):
+        msg = BackMsg()
+        for widget_id, (widget, value) in self.values.items():
+            state = msg.rerun_script.widget_states.widgets.add()
+            state.id = widget_id
+            if widget.type == 'checkbox':
+                state.bool_value = value
+            elif widget.type == 'text_input':
+                state.string_value = value
+            elif widget.type == 'component_instance':
+                state.json_value = json.dumps(value)
+            elif widget.proto.data_type == NumberInput.INT:
+                state.int_value = int(value)
+            else:
+                state.double_value = float(value)
+        if trigger is not None:
+            state = msg.rerun_script.widget_states.widgets.add()
+            state.id = trigger.proto.id
+            state.trigger_value = True
+        return msg
+
+    async def rerun(self, trigger=None, fragment_id=""):
+        """
+        Rerun the page (or one fragment of it) with the current widget values and wait
+        until the script has finished. trigger is a button widget to click.
+
+        Returns:
+        - duration in seconds
+        - number of bytes received
+        """
+        msg = self._widget_states(trigger)
+        msg.rerun_script.query_string = ""
+        msg.rerun_script.fragment_id = fragment_id
+        # Like the browser, report the large messages already received so they are not sent again
+        msg.rerun_script.cached_message_hashes.extend(sorted(self.cached_widgets))
+        if fragment_id:
+            self.widgets = {label: widget for label, widget in self.widgets.items() if widget.fragment != fragment_id}
+        else:
+            self.widgets = {}
+        start = time.perf_counter()
+        await self.conn.write_message(msg.SerializeToString(), binary=True)
+        received = 0
+        while True:
+            data = await self.conn.read_message()
+            if data is None:
+                raise ConnectionError("The server closed the session")
+            received += len(data)
+            forward_msg = ForwardMsg()
+            forward_msg.ParseFromString(data)
+            msg_type = forward_msg.WhichOneof("type")
+            if msg_type == "delta":
+                self._read_delta(forward_msg)
+            elif msg_type == "ref_hash":
+                for widget in self.cached_widgets.get(forward_msg.ref_hash, []):
+                    self._add_widget(widget)
+            elif msg_type == "script_finished":
+                return time.perf_counter() - start, received
+
+    def _read_delta(self, forward_msg):
+        delta = forward_msg.delta
+        found = []
+        if delta.WhichOneof("type") == "new_element":
+            widget_type = delta.new_element.WhichOneof("type")
+            if widget_type in WIDGET_TYPES:
+                found.append(Widget(widget_type, getattr(delta.new_element, widget_type), delta.fragment_id))
+        for widget in found:
+            self._add_widget(widget)
+        if forward_msg.metadata.cacheable:
+            self.cached_widgets[forward_msg.hash] = found
+
+    def close(self):
+        if self.conn is not None:
+            self.conn.close()
+
+
+async def toggle_pe(session, rng):
+    """Flip one PE level checkbox, keeping at least one level selected"""
+    levels = [label for label in session.widgets if label.isdigit()]
+    if not levels:
+        return None
+    selected = [label for label in levels if session.value(label)]
+    label = rng.choice(levels)
+    if selected == [label]:
+        label = rng.choice([level for level in levels if level != label] or [label])
+    session.set_value(label, not session.value(label))
+    return await session.rerun(fragment_id=session.widgets[label].fragment)
+
+
+async def submit_range(session, rng, min_label, max_label, choose):
+    """Edit a min/max pair of number inputs in the filter form and apply it"""
+    submit = session.widget(SUBMIT_LABEL)
+    if submit is None or session.widget(min_label) is None:
+        return None
+    bounds = session.widget(min_label).proto
+    min_value, max_value = choose(rng, bounds.min, bounds.max)
+    session.set_value(min_label, min_value)
+    session.set_value(max_label, max_value)
+    return await session.rerun(trigger=submit, fragment_id=submit.fragment)
+
+
+def fraction_range(rng, lowest, highest):
+    return rng.choice([0.0, 0.1, 0.3, 0.5]), highest
+
+
+def year_range(rng, lowest, highest):
+    start = rng.randint(int(lowest), int(highest))
+    return start, rng.randint(start, int(highest))
+
+
+async def search(session, rng):
+    """Type a search term (or clear it) and apply the filter form"""
+    submit = session.widget(SUBMIT_LABEL)
+    search_label = next((label for label in session.widgets if label.startswith("Search proteins")), None)
+    if submit is None or search_label is None:
+        return None
+    session.set_value(search_label, rng.choice(DESCRIPTION_WORDS + [""]))
+    return await session.rerun(trigger=submit, fragment_id=submit.fragment)
+
+
+async def open_modal(session, rng):
+    """
+    Click View on a random row of the grid. With server-side filtering, the grid sends the
+    selected row and the server lists the publications of that protein below the grid.
+    """
+    grid = session.widget(GRID_COMPONENT)
+    if grid is None:
+        return None
+    grid_options = json.loads(grid.proto.json_args)['gridOptions']
+    # Client-side, the modal opens in the browser from the publications sent with the grid
+    if not grid_options.get('context', {}).get('server_lookup') or not grid_options.get('rowData'):
+        return None
+    # The value the grid component sends on selection_changed, reduced to what the app reads
+    session.set_value(GRID_COMPONENT, {
+        'gridOptions': json.dumps({}),
+        'selectedItems': [rng.choice(grid_options['rowData'])],
+    })
+    return await session.rerun(fragment_id=grid.fragment)
+
+
+async def interact(session, rng, interaction):
+    """
+    Perform one interaction.
+
+    Returns:
+    - (duration in seconds, bytes received), or None when the widgets of the interaction
+      are not on the page (e.g. the filters run in the browser)
+    """
+    if interaction == 'toggle_pe':
+        return await toggle_pe(session, rng)
+    if interaction == 'fraction_range':
+        return await submit_range(session, rng, "Minimum fraction", "Maximum fraction", fraction_range)
+    if interaction == 'year_range':
+        return await submit_range(session, rng, "Minimum year", "Maximum year", year_range)
+    if interaction == 'open_modal':
+        return await open_modal(session, rng)
+    return await search(session, rng)
+
+
+async def run_session(url, deadline, think_time, seed, results, skipped):
+    """
+    Load the page, then replay random interactions with a think time until the deadline.
+    Interactions that could not be sent are counted in skipped, without a latency sample.
+    """
+    rng = random.Random(seed)
+    session = AppSession(url)
+    await session.connect()
+    try:
+        results['page_load'].append(await session.rerun())
+        while time.perf_counter() < deadline:
+            await asyncio.sleep(rng.uniform(0, 2 * think_time))
+            interaction = rng.choice(INTERACTIONS)
+            result = await interact(session, rng, interaction)
+            if result is None:
+                skipped[interaction] += 1
+            else:
+                results[interaction].append(result)
+    finally:
+        session.close()
+
+
+async def sample_memory(pids, peaks, interval=0.5):
+    """Record the peak RSS of each server process until cancelled"""
+    while True:
+        for pid in pids:
+            try:
+                peaks[pid] = max(peaks.get(pid, 0), memory_usage(pid)['Rss'])
+            except OSError:
+                pass
+        await asyncio.sleep(interval)
+
+
+async def run_load_test(url, num_sessions, duration, think_time, pids):
+    results = defaultdict(list)
+    skipped = defaultdict(int)
+    peaks = {}
+    sampler = asyncio.ensure_future(sample_memory(pids, peaks))
+    start = time.perf_counter()
+    try:
+        await asyncio.gather(*[
+            run_session(url, start + duration, think_time, seed, results, skipped) for seed in range(num_sessions)
+        ])
+    finally:
+        sampler.cancel()
+    return results, skipped, time.perf_counter() - start, peaks
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def start_local_server(directory, client_filter_max_links=None):
+    """Start run_app.py on a free port, serving the Arrow dataset in directory"""
+    port = free_port()
+    env = dict(os.environ, **{ARROW_DATASET_ENV: os.path.abspath(directory)})
+    if client_filter_max_links is not None:
+        env["CLIENT_FILTER_MAX_LINKS"] = str(client_filter_max_links)
+    command = [
+        sys.executable, RUN_APP,
+        "--server.port", str(port),
+        "--server.address", "127.0.0.1",
+        "--server.headless", "true",
+    ]
+    process = subprocess.Popen(command, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    wait_until_healthy(port, process)
+    return f"http://127.0.0.1:{port}", process
+
+
+def print_report(results, skipped, elapsed, num_sessions, peaks, rss_before):
+    interactions = sum(len(results[name]) for name in INTERACTIONS if name in results)
+    print(f"Sessions: {num_sessions}, duration: {elapsed:.1f}s, server reruns: {interactions}, "
+          f"skipped interactions: {sum(skipped.values())}")
+    if skipped:
+        print("Skipped (widgets not on the page, e.g. filters and modal running in the browser; not measured): " +
+              ", ".join(f"{name} {count}" for name, count in sorted(skipped.items())))
+    print(f"{'interaction':<16}{'count':>7}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'KB/interaction':>16}")
+    server_runs = [result for name in ['page_load'] + INTERACTIONS for result in results.get(name, [])]
+    for name, runs in [(name, results[name]) for name in ['page_load'] + INTERACTIONS if results.get(name)] + \
+            [('all reruns', server_runs)]:
+        latencies = np.array([latency for latency, _ in runs]) * 1000
+        received = np.mean([size for _, size in runs]) / 1024
+        print(f"{name:<16}{len(runs):>7}" + "".join(f"{value:>9.0f}" for value in np.percentile(latencies, [50, 95, 99]))
+              + f"{received:>16.1f}")
+    for pid, peak in peaks.items():
+        print(f"Server process {pid}: RSS {rss_before.get(pid, float('nan')):.1f} MB before, {peak:.1f} MB peak")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", help="URL of a running app (default: start a local server on a synthetic dataset)")
+    parser.add_argument("--server-pid", type=int, action="append", default=[],
+                        help="Process ID of a server to report the memory of (repeatable)")
+    parser.add_argument("--sessions", type=int, default=16, help="Number of concurrent sessions")
+    parser.add_argument("--duration", type=float, default=30, help="Test duration in seconds")
+    parser.add_argument("--think-time", type=float, default=1.0, help="Mean pause between interactions in seconds")
+    parser.add_argument("--proteins", type=int, default=2000, help="Proteins in the synthetic dataset")
+    parser.add_argument("--publications", type=int, default=40,
+                        help="Mean publications per protein in the synthetic dataset")
+    parser.add_argument("--client-filter-max-links", type=int,
+                        help="CLIENT_FILTER_MAX_LINKS of the local server (0 always filters server-side)")
+    args = parser.parse_args()
+
+    process = None
+    with tempfile.TemporaryDirectory() as directory:
+        url, pids = args.url, args.server_pid
+        if url is None:
+            start = time.perf_counter()
+            path = os.path.join(directory, "pubtator_pubs.pkl")
+            with open(path, "wb") as fh:
+                cp.dump(make_synthetic_dataset(args.proteins, args.publications), fh)
+            # Without the scores and release diff of the output directory, so only the synthetic data is served
+            prepare_arrow_dataset(path, directory, ambiguity_path=None, release_diff_paths=None)
+            url, process = start_local_server(directory, args.client_filter_max_links)
+            pids = [process.pid]
+            print(f"Started a local server on a synthetic dataset of {args.proteins} proteins "
+                  f"at {url} ({time.perf_counter() - start:.1f}s)")
+        try:
+            rss_before = {pid: memory_usage(pid)['Rss'] for pid in pids}
+            results, skipped, elapsed, peaks = asyncio.run(
+                run_load_test(url, args.sessions, args.duration, args.think_time, pids)
+            )
+            print_report(results, skipped, elapsed, args.sessions, peaks, rss_before)
+        finally:
+            if process is not None:
+                process.terminate()
+                process.wait()
+
+
+if __name__ == "__main__":
+    main()
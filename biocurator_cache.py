@@ -0,0 +1,235 @@
+"""
+Process-wide caches shared by every session of the Streamlit app.
+
+Kept in an importable module (rather than in the app script) so that
+run_app.py can fill them during warm-up, before the server accepts connections.
+"""
+import os
+import time
+import streamlit as st
+
+from biocurator_data import (ARROW_DATASET_ENV, ND_PROTEINS_TSV, PUBTATOR_PICKLE, SQLITE_DATASET_ENV,
+                             add_protein_summaries, default_filter_state, filter_bounds, filter_dataset, filter_nd,
+                             join_publications, load_arrow_dataset, load_dataset, load_nd_dataset, pe_counts,
+                             protein_summaries, publication_records, summary_years, year_aspect_counts)
+from biocurator_export import export_filtered, spool_chunks
+from biocurator_sqlite import SqliteDataset
+
+# Selections with up to this many (protein, PMID) links are sent to the browser once and
+# filtered there; larger ones are filtered server-side on every change
+CLIENT_FILTER_MAX_LINKS = int(os.environ.get("CLIENT_FILTER_MAX_LINKS", 30000))
+# Out of core, in-app downloads of more (protein, PMID) links are refused: Streamlit holds
+# a download in memory, about 230 bytes per link as TSV
+EXPORT_MAX_LINKS = int(os.environ.get("EXPORT_MAX_LINKS", 200000))
+
+
+def is_out_of_core():
+    """Whether the publications are queried from the SQLite database of biocurator_sqlite.py instead of held in memory"""
+    return bool(os.environ.get(SQLITE_DATASET_ENV))
+
+
+@st.cache_resource(show_spinner="Loading dataset...")
+def get_dataset():
+    """
+    Load the dataset once per server process and share it across sessions.
+    Out of core, only the proteins are loaded and the store is the SqliteDataset.
+    """
+    if is_out_of_core():
+        dataset = SqliteDataset(os.environ[SQLITE_DATASET_ENV])
+        return dataset.proteins, dataset
+    if os.environ.get(ARROW_DATASET_ENV):
+        return load_arrow_dataset(os.environ[ARROW_DATASET_ENV])
+    return load_dataset(PUBTATOR_PICKLE)
+
+
+@st.cache_resource(show_spinner="Loading ND annotations...")
+def get_nd_dataset():
+    """Load the ND annotations once per server process and share them across sessions"""
+    return load_nd_dataset(ND_PROTEINS_TSV)
+
+
+@st.cache_resource(max_entries=16, show_spinner=False)
+def get_nd_view(aspects, min_year, max_year):
+    """ND annotations filtered by aspect and year range, shared across sessions"""
+    return filter_nd(get_nd_dataset(), aspects, min_year, max_year)
+
+
+@st.cache_data(max_entries=4, show_spinner=False)
+def build_nd_export(aspects, min_year, max_year):
+    """CSV of the filtered ND annotations, cached per filter state"""
+    return get_nd_view(aspects, min_year, max_year).to_csv(index=False)
+
+
+@st.cache_resource(show_spinner=False)
+def get_pe_counts():
+    """Aggregated PE level counts, so the chart spec does not grow with the number of proteins"""
+    non_nd_df, _ = get_dataset()
+    return pe_counts(non_nd_df)
+
+
+@st.cache_resource(show_spinner=False)
+def get_nd_year_aspect_counts():
+    """Aggregated ND annotation counts per year and aspect, so the chart spec does not grow with the table"""
+    return year_aspect_counts(get_nd_dataset())
+
+
+@st.cache_resource(max_entries=32, show_spinner=False)
+def get_filter_bounds(pe_levels):
+    """Default filter ranges for the proteins with the given PE levels, or None without publications"""
+    non_nd_df, store = get_dataset()
+    df = non_nd_df[non_nd_df['protein_existence'].isin(pe_levels)]
+    if is_out_of_core():
+        return store.filter_bounds(df)
+    return filter_bounds(df, store)
+
+
+@st.cache_resource(max_entries=32, show_spinner=False)
+def get_default_filters(pe_levels):
+    """FilterState matching the default values of the grid filters for the given PE levels, or None"""
+    non_nd_df, store = get_dataset()
+    bounds = get_filter_bounds(pe_levels)
+    if bounds is None:
+        return None
+    return default_filter_state(non_nd_df, store, pe_levels, bounds)
+
+
+@st.cache_resource(max_entries=32, show_spinner=False)
+def get_grid_view(filters):
+    """
+    Filtered view of the dataset for a FilterState, shared across sessions.
+    The returned objects must not be modified.
+
+    With the default filters every link is kept, so the summaries precomputed with the
+    dataset are used; otherwise they are recomputed from the filtered links.
+    Out of core, the counts and summaries are computed by the SqliteDataset, and the
+    links and publications are left in the database.
+
+    Returns:
+    - DataFrame of the proteins to display, with their summary columns
+    - DataFrame of the filtered links to their publications (None out of core)
+    - (number of filtered publications, number of proteins with filtered publications)
+    """
+    non_nd_df, store = get_dataset()
+    if is_out_of_core():
+        df, num_publications, num_proteins = store.grid_view(filters)
+        return df, None, (num_publications, num_proteins)
+    df, filtered_links = filter_dataset(non_nd_df, store, filters)
+    if store.summaries is not None and filters == get_default_filters(filters.pe_levels):
+        summaries = store.summaries
+    else:
+        summaries = protein_summaries(store, filtered_links)
+    totals = (len(filtered_links), filtered_links['uniprot_id'].nunique())
+    return add_protein_summaries(df, summaries), filtered_links, totals
+
+
+@st.cache_resource(max_entries=8, show_spinner=False)
+def get_publication_payload(filters):
+    """
+    Normalized publications payload of a grid view, for client-side filtering only
+    (server-side, the grid gets the summaries and fetches publications per protein).
+    The returned dictionary must not be modified.
+    """
+    _, store = get_dataset()
+    _, filtered_links, _ = get_grid_view(filters)
+    return publication_records(store, filtered_links)
+
+
+def get_summary_years():
+    """(first, last) publication year of the dataset, the range of the year histograms"""
+    _, store = get_dataset()
+    return store.year_range if is_out_of_core() else summary_years(store)
+
+
+@st.cache_data(max_entries=64, show_spinner=False)
+def get_protein_publications(uniprot_id, filters):
+    """Filtered publications of one protein, in the order of the dataset"""
+    _, store = get_dataset()
+    if is_out_of_core():
+        return store.protein_publications(uniprot_id, filters)
+    _, filtered_links, _ = get_grid_view(filters)
+    return join_publications(store, filtered_links[filtered_links['uniprot_id'] == uniprot_id])
+
+
+def can_export(filters):
+    """Whether the dataset filtered by a FilterState can be downloaded from the app (see EXPORT_MAX_LINKS)"""
+    if not is_out_of_core():
+        return True
+    _, _, (num_publications, _) = get_grid_view(filters)
+    return num_publications <= EXPORT_MAX_LINKS
+
+
+def build_export(export_format, filters):
+    """
+    Serialize the dataset filtered by a FilterState.
+    Out of core, the export is streamed from the database on every download and not cached,
+    so that memory use does not grow with the number of downloads; can_export bounds its size.
+    """
+    if not is_out_of_core():
+        return build_cached_export(export_format, filters)
+    _, store = get_dataset()
+    df, _, _ = get_grid_view(filters)
+    return spool_chunks(export_format, df, store.iter_publication_chunks(df, filters))
+
+
+@st.cache_data(max_entries=16, show_spinner=False)
+def build_cached_export(export_format, filters):
+    """Serialize the in-memory dataset filtered by a FilterState, cached per format and filter state"""
+    _, store = get_dataset()
+    df, filtered_links, _ = get_grid_view(filters)
+    return export_filtered(export_format, df, store, filtered_links)
+
+
+def default_pe_levels(non_nd_df):
+    """PE levels selected when the page is first opened (all of them)"""
+    return tuple(sorted(non_nd_df['protein_existence'].unique()))
+
+
+def use_client_filtering(pe_levels):
+    """
+    Whether the publications of the selected proteins are small enough to be filtered in the browser
+    (never out of core, where they are not loaded)
+    """
+    if is_out_of_core():
+        return False
+    filters = get_default_filters(pe_levels)
+    if filters is None:
+        return False
+    _, _, (total_filtered_pubs, _) = get_grid_view(filters)
+    return total_filtered_pubs <= CLIENT_FILTER_MAX_LINKS
+
+
+def warm_up():
+    """
+    Load the dataset and precompute the default grid view.
+
+    Returns:
+    - dictionary of stage name to duration in seconds
+    """
+    timings = {}
+    start = time.perf_counter()
+    non_nd_df, store = get_dataset()
+    timings['load dataset'] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    get_pe_counts()
+    timings['chart aggregates'] = time.perf_counter() - start
+
+    if os.path.exists(ND_PROTEINS_TSV):
+        start = time.perf_counter()
+        counts = get_nd_year_aspect_counts()
+        if not counts.empty:
+            get_nd_view(tuple(sorted(counts['aspect'].unique())),
+                        int(counts['year'].min()), int(counts['year'].max()))
+        timings['ND annotations'] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    filters = get_default_filters(default_pe_levels(non_nd_df))
+    if filters is not None:
+        get_grid_view(filters)
+    timings['default grid view'] = time.perf_counter() - start
+
+    if filters is not None and use_client_filtering(filters.pe_levels):
+        start = time.perf_counter()
+        get_publication_payload(filters)
+        timings['client-side grid payload'] = time.perf_counter() - start
+    return timings
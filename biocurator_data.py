@@ -0,0 +1,460 @@
+import os
+import numpy as np
+import pandas as pd
+import pickle as cp
+import pyarrow as pa
+import sys
+from collections import namedtuple
+
+# Pandas 2.0+ compatibility shim for unpickling data from older pandas versions
+if pd.__version__.split('.')[0] in ['2', '3']:
+    import pandas.core.indexes.base
+    sys.modules['pandas.core.indexes.numeric'] = pandas.core.indexes.base
+    # Map classes that were removed in pandas 2.0
+    pandas.core.indexes.base.Int64Index = pd.Index
+    pandas.core.indexes.base.UInt64Index = pd.Index
+    pandas.core.indexes.base.Float64Index = pd.Index
+
+# Same PROTEIN_OUTPUT_DIR variable as paths_config.py
+OUTPUT_DIR = os.environ.get("PROTEIN_OUTPUT_DIR", "output")
+PUBTATOR_PICKLE = os.path.join(OUTPUT_DIR, "pubtator_pubs.pkl")
+ND_PROTEINS_TSV = os.path.join(OUTPUT_DIR, "ND_proteins.tsv")
+# Written by alias_ambiguity.py; merged into the proteins table when present
+AMBIGUITY_SCORES_TSV = os.path.join(OUTPUT_DIR, "ambiguity_scores.tsv")
+AMBIGUITY_COLUMNS = ['ambiguity_score', 'ambiguous_aliases']
+# Written by release_diff.py; flag the proteins and publications new since the previous snapshot
+RELEASE_DIFF_PROTEINS_TSV = os.path.join(OUTPUT_DIR, "release_diff_proteins.tsv")
+RELEASE_DIFF_PUBLICATIONS_TSV = os.path.join(OUTPUT_DIR, "release_diff_publications.tsv")
+NEW_SINCE_RELEASE = 'new_since_last_release'
+
+# Memory-mappable copy of the prepared dataset (see write_arrow_dataset)
+DATASET_ARROW_DIR = os.path.join(OUTPUT_DIR, "dataset_arrow")
+# Set by serve_multi.py: its workers memory-map this copy instead of loading the pickle
+ARROW_DATASET_ENV = "BIOCURATOR_ARROW_DATASET"
+ARROW_TABLES = ['proteins', 'publications', 'links', 'summaries']
+# On-disk copy queried out of core on low-memory hosts (see biocurator_sqlite.py)
+DATASET_SQLITE = os.path.join(OUTPUT_DIR, "dataset.sqlite")
+SQLITE_DATASET_ENV = "BIOCURATOR_SQLITE_DATASET"
+
+# Publication attributes that only depend on the PMID; stored once per PMID.
+# canonical_pmid (added by title_dedup.py) is the PMID of its cluster of near-duplicate titles.
+PUBLICATION_COLUMNS = ['pmid', 'year', 'total_genes', 'journal', 'full_text', 'title', 'canonical_pmid']
+# Attributes of the mention of a protein in a publication
+LINK_COLUMNS = ['uniprot_id', 'pmid', 'fraction_mentions', 'in_title', 'score']
+
+# Per-protein summaries of the links (see protein_summaries), shown by the grid
+# overview columns and tooltip instead of the publications themselves
+SUMMARY_COLUMNS = ['year_histogram', 'max_fraction', 'mean_fraction', 'in_title_count', 'top_publications']
+TOP_PUBLICATION_FIELDS = ['pmid', 'year', 'fraction_mentions', 'in_title', 'title']
+NUM_TOP_PUBLICATIONS = 3
+
+# Normalized publications: one row per PMID (sorted by PMID) and one link row
+# per (protein, PMID). links['pub_row'] is the position of the PMID in publications.
+# summaries holds the protein_summaries of all the links, computed when the dataset is loaded.
+PublicationStore = namedtuple('PublicationStore', ['publications', 'links', 'summaries'], defaults=[None])
+
+# Active filters of the publications grid. Kept hashable so it can be used
+# directly as a cache key by the app and the exports. new_only keeps the
+# publications (and proteins) new since the last release only, and
+# collapse_duplicates keeps one publication per cluster of near-duplicate titles.
+FilterState = namedtuple(
+    'FilterState',
+    ['pe_levels', 'min_fraction', 'max_fraction', 'min_year', 'max_year',
+     'min_last_reviewed', 'max_last_reviewed', 'search_query', 'new_only', 'collapse_duplicates'],
+    defaults=[False, False]
+)
+
+
+def build_publication_store(pubs):
+    """
+    Split a long publication table (one row per protein and PMID, with a uniprot_id column)
+    into a PublicationStore
+    """
+    pubs = pubs.astype({'pmid': 'int64', 'year': 'int16'})
+    if 'canonical_pmid' in pubs.columns:
+        pubs['canonical_pmid'] = pubs['canonical_pmid'].astype('int64')
+    publications = pubs.drop_duplicates('pmid')[
+        [col for col in PUBLICATION_COLUMNS if col in pubs.columns]
+    ].sort_values('pmid').reset_index(drop=True)
+    if 'journal' in publications.columns:
+        publications['journal'] = publications['journal'].astype('category')
+    links = pubs[[col for col in LINK_COLUMNS if col in pubs.columns]].reset_index(drop=True)
+    links['pub_row'] = publications['pmid'].searchsorted(links['pmid']).astype('int32')
+    return PublicationStore(publications, links)
+
+
+def load_dataset(path=PUBTATOR_PICKLE, ambiguity_path=AMBIGUITY_SCORES_TSV,
+                 release_diff_paths=(RELEASE_DIFF_PROTEINS_TSV, RELEASE_DIFF_PUBLICATIONS_TSV)):
+    """
+    Load the pre-processed (non_nd_df, unreviewed_dict) pickle and prepare it for display.
+    Unreviewed publications published before the last reviewed publication year
+    of their protein are removed. Alias ambiguity scores and the new_since_last_release
+    flags of the release diff are added when available.
+
+    Returns:
+    - DataFrame of the proteins
+    - PublicationStore of their unreviewed publications
+    """
+    with open(path, "rb") as fh:
+        (non_nd_df, unreviewed_dict) = cp.load(fh)
+
+    # Format last reviewed publication year
+    non_nd_df['last_reviewed_pubyear'] = non_nd_df['last_reviewed_pubyear'].apply(
+        lambda x: (int(x)) if not pd.isnull(x) else x
+    )
+
+    if ambiguity_path and os.path.exists(ambiguity_path):
+        scores = pd.read_csv(ambiguity_path, sep="\t", header=0, keep_default_na=False)
+        non_nd_df = non_nd_df.merge(scores[['uniprot_id'] + AMBIGUITY_COLUMNS], on='uniprot_id', how='left')
+
+    frames = [
+        pubs.assign(uniprot_id=uniprot_id) for uniprot_id, pubs in unreviewed_dict.items()
+        if isinstance(pubs, pd.DataFrame) and not pubs.empty
+    ]
+    pubs = pd.concat(frames, ignore_index=True) if frames else \
+        pd.DataFrame(columns=list(dict.fromkeys(LINK_COLUMNS + PUBLICATION_COLUMNS)))
+
+    # Remove unreviewed publications before last_reviewed_pubyear
+    last_reviewed = non_nd_df.set_index('uniprot_id')['last_reviewed_pubyear']
+    last_reviewed = last_reviewed[~last_reviewed.index.duplicated()]
+    last_reviewed_year = pubs['uniprot_id'].map(last_reviewed).fillna(0)
+    pubs = pubs[pubs['year'].astype(int) > last_reviewed_year]
+    store = build_publication_store(pubs)
+    if release_diff_paths and all(os.path.exists(diff_path) for diff_path in release_diff_paths):
+        non_nd_df = mark_release_diff(non_nd_df, store, *release_diff_paths)
+    return non_nd_df, store._replace(summaries=protein_summaries(store, store.links))
+
+
+def mark_release_diff(non_nd_df, store, proteins_path, publications_path):
+    """
+    Add the new_since_last_release flag, from the files written by release_diff.py, to the
+    proteins (newly unannotated proteins) and to the links (publications added since the previous snapshot)
+    """
+    new_proteins = pd.read_csv(proteins_path, sep="\t", header=0, dtype={'uniprot_id': str})
+    new_proteins = new_proteins.loc[new_proteins['change'] == 'new_unannotated', 'uniprot_id']
+    non_nd_df = non_nd_df.assign(**{NEW_SINCE_RELEASE: non_nd_df['uniprot_id'].isin(new_proteins)})
+
+    new_links = pd.read_csv(publications_path, sep="\t", header=0, dtype={'uniprot_id': str, 'pmid': 'int64'})
+    new_index = pd.MultiIndex.from_frame(new_links[['uniprot_id', 'pmid']])
+    store.links[NEW_SINCE_RELEASE] = pd.MultiIndex.from_frame(store.links[['uniprot_id', 'pmid']]).isin(new_index)
+    return non_nd_df
+
+
+def write_arrow_dataset(non_nd_df, store, directory=DATASET_ARROW_DIR):
+    """
+    Write a prepared dataset (as returned by load_dataset) as one uncompressed Arrow IPC
+    file per table, so that load_arrow_dataset can memory-map it
+    """
+    os.makedirs(directory, exist_ok=True)
+    summaries = store.summaries.reset_index() if store.summaries is not None else None
+    for name, df in zip(ARROW_TABLES, [non_nd_df, store.publications, store.links, summaries]):
+        if df is None:
+            continue
+        table = pa.Table.from_pandas(df, preserve_index=False)
+        path = os.path.join(directory, f"{name}.arrow")
+        # Write to a temporary file first: running processes may have the current one mapped
+        with pa.OSFile(path + ".tmp", "wb") as sink:
+            with pa.ipc.new_file(sink, table.schema) as writer:
+                writer.write_table(table)
+        os.replace(path + ".tmp", path)
+
+
+def load_arrow_dataset(directory=DATASET_ARROW_DIR):
+    """
+    Memory-map a dataset written by write_arrow_dataset.
+    Text columns (pandas 3 stores them as Arrow strings) and numeric columns without missing
+    values stay backed by the read-only mapping, so processes loading the same files share
+    those pages instead of copying them.
+
+    Returns:
+    - DataFrame of the proteins
+    - PublicationStore of their unreviewed publications
+    """
+    frames = []
+    for name in ARROW_TABLES:
+        path = os.path.join(directory, f"{name}.arrow")
+        if not os.path.exists(path):
+            frames.append(None)
+            continue
+        table = pa.ipc.open_file(pa.memory_map(path, "r")).read_all()
+        frames.append(table.to_pandas(split_blocks=True))
+    non_nd_df, publications, links, summaries = frames
+    store = PublicationStore(publications, links)
+    if summaries is None:
+        return non_nd_df, store._replace(summaries=protein_summaries(store, links))
+    return non_nd_df, store._replace(summaries=summaries.set_index('uniprot_id'))
+
+
+def join_publications(store, links):
+    """Long publication table: the given link rows with their publication attributes"""
+    publications = store.publications.iloc[links['pub_row'].values].drop(columns='pmid')
+    publications.index = links.index
+    return pd.concat([links.drop(columns='pub_row'), publications], axis=1)
+
+
+def load_nd_dataset(path=ND_PROTEINS_TSV):
+    """
+    Load the table of ND annotations (one row per annotation).
+    Repetitive text columns are stored as categoricals and the year as a
+    small integer to keep full-GAF tables compact in memory.
+    """
+    nd_df = pd.read_csv(path, sep="\t", header=0)
+    nd_df['year'] = pd.to_numeric(nd_df['year'], errors='coerce').astype('Int16')
+    for col in nd_df.columns:
+        if col != 'year' and not pd.api.types.is_numeric_dtype(nd_df[col]):
+            if nd_df[col].nunique() <= len(nd_df) // 2:
+                nd_df[col] = nd_df[col].astype('category')
+    return nd_df
+
+
+def filter_nd(nd_df, aspects, min_year, max_year):
+    """ND annotations with one of the given aspects and a year in the given range"""
+    mask = nd_df['aspect'].isin(aspects) & nd_df['year'].between(min_year, max_year).fillna(False)
+    return nd_df[mask]
+
+
+def pe_counts(non_nd_df):
+    """Number of proteins per protein existence level, for the PE barplot"""
+    evidence_dist = non_nd_df['protein_existence'].value_counts()
+    return evidence_dist.reset_index().rename(columns={'count': 'Count', 'protein_existence': 'Protein Existence Level (PE)'})
+
+
+def year_aspect_counts(nd_df):
+    """Number of ND annotations per year and aspect, for the ND barplot"""
+    return nd_df.groupby(['year', 'aspect'], observed=True).size().reset_index(name='count')
+
+
+def filter_bounds(df, store):
+    """
+    Compute the default filter ranges for the proteins in df.
+
+    Returns:
+    - dictionary with the (min, max) fraction_mentions, publication year and
+      last reviewed publication year, or None if the proteins have no publications
+    """
+    links = store.links[store.links['uniprot_id'].isin(df['uniprot_id'])]
+    if links.empty:
+        return None
+    fractions = links['fraction_mentions'].astype(float)
+    years = store.publications['year'].values[links['pub_row'].values]
+    return {
+        'fraction': (max(0.0, float(fractions.min())), min(1.0, float(fractions.max()))),
+        'year': (int(years.min()), int(years.max())),
+        'last_reviewed': (int(df['last_reviewed_pubyear'].min()), int(df['last_reviewed_pubyear'].max())),
+    }
+
+
+def default_filter_state(df, store, pe_levels=None, bounds=None):
+    """
+    FilterState matching the default values of the grid filters, or None if there are no publications.
+    Precomputed filter_bounds can be passed to skip recomputing them.
+    """
+    if bounds is None:
+        bounds = filter_bounds(df, store)
+    if bounds is None:
+        return None
+    return FilterState(
+        pe_levels=pe_levels,
+        min_fraction=bounds['fraction'][0],
+        max_fraction=bounds['fraction'][1],
+        min_year=bounds['year'][0],
+        max_year=bounds['year'][1],
+        min_last_reviewed=bounds['last_reviewed'][0],
+        max_last_reviewed=bounds['last_reviewed'][1],
+        search_query='',
+        new_only=False,
+        collapse_duplicates=False
+    )
+
+
+def filter_links(store, uniprot_ids, min_fraction, max_fraction, min_year, max_year):
+    """Links of the given proteins to the publications that fall in the fraction and year ranges"""
+    links = store.links
+    fractions = links['fraction_mentions'].astype(float)
+    years = store.publications['year'].values[links['pub_row'].values]
+    return links[
+        links['uniprot_id'].isin(uniprot_ids) &
+        (fractions >= min_fraction) &
+        (fractions <= max_fraction) &
+        (years >= min_year) &
+        (years <= max_year)
+    ]
+
+
+def collapse_duplicate_links(store, links):
+    """
+    Keep one link per protein and cluster of near-duplicate publications: the link to the
+    canonical PMID when it is among the links, otherwise the first one
+    """
+    canonical = store.publications['canonical_pmid'].values[links['pub_row'].values]
+    keys = pd.DataFrame({
+        'uniprot_id': links['uniprot_id'].values,
+        'canonical_pmid': canonical,
+        'not_canonical': links['pmid'].values != canonical,
+    })
+    kept = keys.sort_values('not_canonical', kind='stable').drop_duplicates(['uniprot_id', 'canonical_pmid']).index
+    return links.iloc[np.sort(kept.values)]
+
+
+def summary_years(store):
+    """(first, last) publication year of the dataset: the range of the year histograms of protein_summaries"""
+    years = store.publications['year']
+    if years.empty:
+        return 0, 0
+    return int(years.min()), int(years.max())
+
+
+def protein_summaries(store, links, top=NUM_TOP_PUBLICATIONS, year_range=None):
+    """
+    Summarize the links of each protein, so the grid overview does not need its publications.
+    The top publications are ranked by in_title, then fraction_mentions, then most recent year
+    (then smallest PMID). year_range overrides summary_years(store), e.g. for a store holding part of the dataset.
+
+    Returns:
+    - DataFrame indexed by uniprot_id, one row per protein with links, with the year_histogram
+      (number of publications per year of summary_years), max_fraction, mean_fraction,
+      in_title_count and top_publications (records of TOP_PUBLICATION_FIELDS)
+    """
+    proteins, codes = np.unique(links['uniprot_id'].astype(str).values, return_inverse=True)
+    first_year, last_year = year_range or summary_years(store)
+    years = store.publications['year'].values[links['pub_row'].values].astype(np.int64)
+    fractions = links['fraction_mentions'].astype(float).values
+    in_title = links['in_title'].fillna(False).astype(bool).values
+    pmids = links['pmid'].values.astype(np.int64)
+
+    histogram = np.zeros((len(proteins), last_year - first_year + 1), dtype=np.int32)
+    np.add.at(histogram, (codes, years - first_year), 1)
+    counts = np.bincount(codes, minlength=len(proteins))
+    max_fraction = np.full(len(proteins), -np.inf)
+    np.maximum.at(max_fraction, codes, fractions)
+
+    # Rank the links of each protein and keep the first ones
+    order = np.lexsort((pmids, -years, -fractions, ~in_title, codes))
+    starts = np.searchsorted(codes[order], np.arange(len(proteins) + 1))
+    rank = np.arange(len(order)) - starts[codes[order]]
+    top_rows = order[rank < top]
+    titles = store.publications['title'].values[links['pub_row'].values[top_rows]] \
+        if 'title' in store.publications.columns else np.full(len(top_rows), None)
+    records = pd.DataFrame({
+        'pmid': pmids[top_rows],
+        'year': years[top_rows],
+        'fraction_mentions': fractions[top_rows],
+        'in_title': in_title[top_rows],
+        'title': titles,
+    }).astype(object).where(lambda records: records.notna(), None).to_dict('records')
+    bounds = np.r_[0, np.cumsum(np.minimum(counts, top))]
+
+    return pd.DataFrame({
+        'year_histogram': list(histogram),
+        'max_fraction': max_fraction,
+        'mean_fraction': np.bincount(codes, weights=fractions, minlength=len(proteins)) / counts,
+        'in_title_count': np.bincount(codes, weights=in_title, minlength=len(proteins)).astype(int),
+        'top_publications': [records[start:stop] for start, stop in zip(bounds[:-1], bounds[1:])],
+    }, index=pd.Index(proteins, name='uniprot_id'))
+
+
+def add_protein_summaries(df, summaries):
+    """Join protein_summaries to the proteins of df; proteins without links get empty summaries"""
+    df = df.join(summaries[SUMMARY_COLUMNS], on='uniprot_id')
+    df['in_title_count'] = df['in_title_count'].fillna(0).astype(int)
+    return df
+
+
+def search_mask(df, search_query):
+    """
+    Boolean mask of the rows where any column contains any of the comma-separated
+    search terms (case-insensitive, partial match)
+    """
+    search_terms = [term.strip().lower() for term in search_query.split(',')]
+    mask = pd.Series(False, index=df.index)
+    for col in df.columns:
+        values = df[col].astype(str).str.lower()
+        for term in search_terms:
+            mask |= values.str.contains(term, regex=False)
+    return mask
+
+
+def filter_proteins(non_nd_df, filters):
+    """Proteins passing the PE level and last reviewed year filters of a FilterState"""
+    df = non_nd_df
+    if filters.pe_levels is not None:
+        df = df[df['protein_existence'].isin(filters.pe_levels)]
+
+    # Handle potential NaN values that might result from the conversion
+    return df[
+        (df['last_reviewed_pubyear'].notna()) &
+        (df['last_reviewed_pubyear'] >= filters.min_last_reviewed) &
+        (df['last_reviewed_pubyear'] <= filters.max_last_reviewed)
+    ]
+
+
+def select_links(store, links, filters):
+    """Apply the new_only and collapse_duplicates filters to links already filtered by fraction and year"""
+    if filters.new_only and NEW_SINCE_RELEASE in links.columns:
+        links = links[links[NEW_SINCE_RELEASE]]
+    if filters.collapse_duplicates and 'canonical_pmid' in store.publications.columns:
+        links = collapse_duplicate_links(store, links)
+    return links
+
+
+def count_publications(df, link_counts, filters):
+    """
+    Set num_unreviewed_publications from the number of filtered links per protein,
+    then apply the new_only protein filter and the search
+    """
+    # Update num_unreviewed_publications in the main DataFrame
+    df = df.copy()
+    df['num_unreviewed_publications'] = df['uniprot_id'].map(link_counts).fillna(0).astype(int)
+
+    # Keep the newly unannotated proteins and those with new publications
+    if filters.new_only and NEW_SINCE_RELEASE in df.columns:
+        df = df[df[NEW_SINCE_RELEASE] | (df['num_unreviewed_publications'] > 0)]
+
+    # Apply search filter if search terms exist
+    if filters.search_query:
+        df = df[search_mask(df, filters.search_query)]
+    return df
+
+
+def filter_dataset(non_nd_df, store, filters):
+    """
+    Apply a FilterState to the dataset.
+
+    Returns:
+    - DataFrame of the proteins to display, with num_unreviewed_publications recomputed
+    - DataFrame of the filtered links for every protein passing the last reviewed year filter
+    """
+    df = filter_proteins(non_nd_df, filters)
+    filtered_links = filter_links(
+        store,
+        df['uniprot_id'],
+        filters.min_fraction,
+        filters.max_fraction,
+        filters.min_year,
+        filters.max_year
+    )
+    filtered_links = select_links(store, filtered_links, filters)
+    return count_publications(df, filtered_links['uniprot_id'].value_counts(), filters), filtered_links
+
+
+def publication_records(store, links):
+    """
+    Convert filtered links to the normalized JSON-serializable payload used by the grid renderers.
+
+    Returns:
+    - dictionary with 'publications': PMID -> publication attributes, stored once per PMID,
+      and 'links': uniprot_id -> {'pmid': [...], 'fraction_mentions': [...], 'in_title': [...]}
+      with the links of the protein in display order (and their new_since_last_release flags
+      when the release diff is loaded)
+    """
+    publications = store.publications.iloc[np.unique(links['pub_row'].values)]
+    publications = publications.astype(object).where(publications.notna(), None)
+    publication_dict = {
+        str(row[0]): dict(zip(publications.columns, row)) for row in publications.values.tolist()
+    }
+    link_fields = [col for col in ['pmid', 'fraction_mentions', 'in_title', NEW_SINCE_RELEASE] if col in links.columns]
+    link_values = links[link_fields].astype(object).where(links[link_fields].notna(), None)
+    link_dict = {}
+    for uniprot_id, rows in link_values.groupby(links['uniprot_id'].astype(str), sort=False):
+        link_dict[uniprot_id] = {field: rows[field].tolist() for field in link_fields}
+    return {'publications': publication_dict, 'links': link_dict}
@@ -0,0 +1,194 @@
+"""
+Exports of the filtered proteins and their publications, shared by the app and the API.
+
+Also writes the full dataset with the default filters, as potential_pubs.tsv:
+
+    python biocurator_export.py [--data output/pubtator_pubs.pkl] [--out output/potential_pubs.tsv]
+
+or, from the out-of-core dataset of biocurator_sqlite.py, without loading the publications:
+
+    python biocurator_export.py --sqlite output/dataset.sqlite
+"""
+import argparse
+import io
+import tempfile
+import zipfile
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from biocurator_data import PUBTATOR_PICKLE, default_filter_state, filter_dataset, join_publications, load_dataset
+
+# Protein columns repeated on every publication row, as in potential_pubs.tsv
+PROTEIN_COLUMNS = ['uniprot_id', 'ncbi_gene', 'gene_name', 'gene_description', 'gene_aliases']
+EXPORT_COLUMNS = ['pmid', 'year', 'in_title', 'fraction_mentions', 'total_genes', 'journal', 'full_text', 'title']
+
+# Fixed Parquet schema so every row group has the same types; other columns are text
+PARQUET_TYPES = {
+    'pmid': pa.int64(),
+    'year': pa.int64(),
+    'in_title': pa.bool_(),
+    'full_text': pa.bool_(),
+    'fraction_mentions': pa.float64(),
+    'total_genes': pa.int64(),
+}
+
+# Exports larger than this are spooled to a temporary file while they are written
+SPOOL_MAX_BYTES = 32 * 1024 * 1024
+
+EXPORT_FORMATS = {
+    'TSV': ('potential_pubs.tsv', 'text/tab-separated-values'),
+    'Parquet': ('potential_pubs.parquet', 'application/vnd.apache.parquet'),
+    'ZIP': ('potential_pubs.zip', 'application/zip'),
+}
+
+
+def iter_publication_chunks(df, store, filtered_links, chunk_size=500):
+    """
+    Yield the publications of the proteins in df as long-format DataFrames,
+    chunk_size proteins at a time and in the order of df, with the protein columns prepended
+    """
+    protein_columns = [col for col in PROTEIN_COLUMNS if col in df.columns]
+    # Order the links once by the position of their protein in df, then slice per chunk
+    positions = pd.Index(df['uniprot_id']).get_indexer(filtered_links['uniprot_id'])
+    order = np.argsort(positions, kind='stable')
+    order = order[positions[order] >= 0]
+    links = filtered_links.iloc[order]
+    bounds = np.searchsorted(positions[order], np.arange(0, len(df) + chunk_size, chunk_size))
+    for chunk_index, start in enumerate(range(0, len(df), chunk_size)):
+        chunk_links = links.iloc[bounds[chunk_index]:bounds[chunk_index + 1]]
+        if chunk_links.empty:
+            continue
+        proteins = df.iloc[start:start + chunk_size][protein_columns]
+        pubs = join_publications(store, chunk_links)
+        pubs = pubs[['uniprot_id'] + [col for col in EXPORT_COLUMNS if col in pubs.columns]]
+        chunk = pubs.merge(proteins, on='uniprot_id', how='left')
+        yield chunk[protein_columns + [col for col in chunk.columns if col not in protein_columns]]
+
+
+def write_tsv(fh, df, chunks):
+    """Stream the publication chunks as TSV into a binary file handle"""
+    header = True
+    for chunk in chunks:
+        fh.write(chunk.to_csv(index=False, sep="\t", header=header).encode())
+        header = False
+
+
+def write_parquet(fh, df, chunks):
+    """Stream the publication chunks as Parquet into a binary file handle, one row group per chunk"""
+    writer = None
+    try:
+        for chunk in chunks:
+            schema = pa.schema([(col, PARQUET_TYPES.get(col, pa.string())) for col in chunk.columns])
+            string_columns = [col for col in chunk.columns if col not in PARQUET_TYPES]
+            # Nullable integers, so a missing year or gene count does not turn the column into floats
+            integer_columns = [col for col in chunk.columns if PARQUET_TYPES.get(col) == pa.int64()]
+            chunk = chunk.astype({col: 'string' for col in string_columns} | {col: 'Int64' for col in integer_columns})
+            if writer is None:
+                writer = pq.ParquetWriter(fh, schema)
+            writer.write_table(pa.Table.from_pandas(chunk, schema=schema, preserve_index=False))
+    finally:
+        if writer is not None:
+            writer.close()
+
+
+def write_zip(fh, df, chunks, chunk_size=500):
+    """Stream a ZIP bundle with the filtered proteins and their publication chunks"""
+    with zipfile.ZipFile(fh, 'w', compression=zipfile.ZIP_DEFLATED) as zf:
+        with zf.open('proteins.tsv', 'w') as member:
+            for start in range(0, len(df), chunk_size):
+                chunk = df.iloc[start:start + chunk_size]
+                member.write(chunk.to_csv(index=False, sep="\t", header=start == 0).encode())
+        with zf.open('publications.tsv', 'w') as member:
+            write_tsv(member, df, chunks)
+
+
+WRITERS = {'TSV': write_tsv, 'Parquet': write_parquet, 'ZIP': write_zip}
+
+
+def export_filtered(export_format, df, store, filtered_links, chunk_size=500):
+    """
+    Serialize the filtered proteins and their filtered publications.
+    Parameters:
+    - export_format: str, one of EXPORT_FORMATS
+    - df: pandas DataFrame of the filtered proteins
+    - store: PublicationStore of the dataset
+    - filtered_links: DataFrame of the filtered links of the proteins
+    - chunk_size: int, number of proteins serialized at a time
+
+    Returns:
+    - BytesIO of the exported file (see export_chunks)
+    """
+    return export_chunks(export_format, df, iter_publication_chunks(df, store, filtered_links, chunk_size))
+
+
+def export_chunks(export_format, df, chunks):
+    """
+    Serialize the filtered proteins and their publications, given as the chunks of
+    iter_publication_chunks (or of an out-of-core backend).
+
+    Returns:
+    - BytesIO of the exported file, rewound; returned as is rather than copied out with getvalue()
+    """
+    if export_format not in WRITERS:
+        raise ValueError(f"Unknown export format: {export_format}")
+    buffer = io.BytesIO()
+    WRITERS[export_format](buffer, df, chunks)
+    buffer.seek(0)
+    return buffer
+
+
+def spool_chunks(export_format, df, chunks):
+    """
+    Same as export_chunks, but the file is written to a temporary file (kept in memory up to
+    SPOOL_MAX_BYTES) and read back once, so the export is never held twice in memory
+
+    Returns:
+    - bytes of the exported file
+    """
+    if export_format not in WRITERS:
+        raise ValueError(f"Unknown export format: {export_format}")
+    with tempfile.SpooledTemporaryFile(max_size=SPOOL_MAX_BYTES) as fh:
+        WRITERS[export_format](fh, df, chunks)
+        fh.seek(0)
+        return fh.read()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--data", default=PUBTATOR_PICKLE, help="Path to the pubtator pickle")
+    parser.add_argument("--sqlite", help="Export from this SQLite dataset (see biocurator_sqlite.py) instead of --data")
+    parser.add_argument("--format", choices=list(EXPORT_FORMATS), default='TSV', help="Export format")
+    parser.add_argument("--out", help="Output file (default: the export file name, e.g. potential_pubs.tsv)")
+    args = parser.parse_args()
+
+    out = args.out or EXPORT_FORMATS[args.format][0]
+    if args.sqlite:
+        # Imported here: biocurator_sqlite imports this module
+        from biocurator_sqlite import SqliteDataset
+        dataset = SqliteDataset(args.sqlite)
+        filters = default_filter_state(dataset.proteins, None, bounds=dataset.filter_bounds(dataset.proteins))
+        if filters is None:
+            df, num_publications, num_proteins = dataset.proteins.iloc[:0], 0, 0
+        else:
+            df, num_publications, num_proteins = dataset.grid_view(filters)
+        with open(out, "wb") as fh:
+            WRITERS[args.format](fh, df, dataset.iter_publication_chunks(df, filters))
+        print(f"Wrote {num_publications} publications of {num_proteins} proteins to {out}")
+        return
+
+    non_nd_df, store = load_dataset(args.data)
+    filters = default_filter_state(non_nd_df, store)
+    if filters is None:
+        df, filtered_links = non_nd_df.iloc[:0], store.links.iloc[:0]
+    else:
+        df, filtered_links = filter_dataset(non_nd_df, store, filters)
+    # Streamed straight to the file, without holding the whole export in memory
+    with open(out, "wb") as fh:
+        WRITERS[args.format](fh, df, iter_publication_chunks(df, store, filtered_links))
+    print(f"Wrote {len(filtered_links)} publications of {filtered_links['uniprot_id'].nunique()} proteins to {out}")
+
+
+if __name__ == "__main__":
+    main()
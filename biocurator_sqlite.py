@@ -0,0 +1,340 @@
+"""
+Out-of-core backend for low-memory hosts.
+
+The prepared dataset is written once to an SQLite database:
+
+    python biocurator_sqlite.py [--data output/pubtator_pubs.pkl] [--out output/dataset.sqlite]
+
+and the app queries it instead of loading the publications into memory:
+
+    BIOCURATOR_SQLITE_DATASET=output/dataset.sqlite python run_app.py
+
+Only the proteins table is held in memory, as the grid shows one row per protein.
+The links and publications stay on disk. The fraction, year and new-since-release
+filters are pushed down into indexed queries, and the counts and grid summaries into
+GROUP BY and window queries. Where the links themselves are needed (collapse of
+near-duplicates, the publications of a protein, exports), they are read a chunk of proteins
+at a time and go through the same functions as the in-memory dataset. The results are
+identical, and memory use depends on the chunk size and the SQLite page cache, not on the
+number of publications.
+"""
+import argparse
+import json
+import os
+import sqlite3
+import threading
+import time
+
+import numpy as np
+import pandas as pd
+
+from biocurator_data import (DATASET_SQLITE, NEW_SINCE_RELEASE, NUM_TOP_PUBLICATIONS, PUBTATOR_PICKLE,
+                             SUMMARY_COLUMNS, PublicationStore, add_protein_summaries, count_publications,
+                             filter_proteins, join_publications, load_dataset, protein_summaries, select_links)
+from biocurator_export import iter_publication_chunks
+
+# Proteins per pushed-down query
+CHUNK_PROTEINS = 500
+# Proteins per aggregate query (below SQLite's limit on the number of query parameters)
+AGGREGATE_PROTEINS = 10000
+INSERT_ROWS = 50000
+CACHE_MB = 64
+# Position of the row in the in-memory tables, restored as the index
+ROW_COLUMN = 'row_index'
+# Publication year copied to the links table, so that the links are filtered and aggregated without a join
+LINK_YEAR_COLUMN = 'pub_year'
+
+
+def sql_type(dtype):
+    if pd.api.types.is_bool_dtype(dtype) or pd.api.types.is_integer_dtype(dtype):
+        return 'INTEGER'
+    if pd.api.types.is_float_dtype(dtype):
+        return 'REAL'
+    return 'TEXT'
+
+
+def dtype_meta(dtype):
+    """JSON description of a column dtype; categoricals keep their categories and their order"""
+    if isinstance(dtype, pd.CategoricalDtype):
+        return {'categories': dtype.categories.tolist(), 'ordered': bool(dtype.ordered)}
+    return str(dtype)
+
+
+def write_table(con, name, df, primary_key=None):
+    """Create a table for df (with its index as ROW_COLUMN) and insert its rows in batches"""
+    columns = [(ROW_COLUMN, 'INTEGER')] + [(col, sql_type(df[col].dtype)) for col in df.columns]
+    definitions = [
+        f'"{col}" {kind}' + (' PRIMARY KEY' if col == (primary_key or ROW_COLUMN) else '') for col, kind in columns
+    ]
+    con.execute(f'CREATE TABLE {name} ({", ".join(definitions)})')
+    insert = f'INSERT INTO {name} VALUES ({", ".join("?" * len(columns))})'
+    for start in range(0, len(df), INSERT_ROWS):
+        chunk = df.iloc[start:start + INSERT_ROWS]
+        # Python objects (not NumPy scalars), with missing values as NULL
+        chunk = chunk.astype(object).where(chunk.notna(), None)
+        con.executemany(insert, zip(chunk.index.tolist(), *(chunk[col].tolist() for col in chunk.columns)))
+    con.execute('INSERT INTO meta VALUES (?, ?)', (name, json.dumps({col: dtype_meta(df[col].dtype) for col in df.columns})))
+
+
+def write_sqlite_dataset(non_nd_df, store, path=DATASET_SQLITE):
+    """
+    Write a prepared dataset (as returned by load_dataset) to an SQLite database:
+    proteins, publications (keyed by PMID) and links (indexed by protein), with the
+    dtypes of every column so that SqliteDataset restores the same DataFrames
+    """
+    if os.path.exists(path + ".tmp"):
+        os.remove(path + ".tmp")
+    con = sqlite3.connect(path + ".tmp")
+    try:
+        con.execute('CREATE TABLE meta (name TEXT PRIMARY KEY, dtypes TEXT)')
+        write_table(con, 'proteins', non_nd_df)
+        write_table(con, 'publications', store.publications, primary_key='pmid')
+        links = store.links.drop(columns='pub_row')
+        links[LINK_YEAR_COLUMN] = store.publications['year'].values[store.links['pub_row'].values]
+        write_table(con, 'links', links)
+        con.execute(f'CREATE INDEX links_protein ON links (uniprot_id, {ROW_COLUMN})')
+        con.commit()
+        con.execute('ANALYZE')
+    finally:
+        con.close()
+    # Replace the database in one step: running apps may have the current one open
+    os.replace(path + ".tmp", path)
+
+
+def restore_dtypes(df, dtypes):
+    """Cast the columns read from SQLite back to their in-memory dtypes"""
+    for col, dtype in dtypes.items():
+        if isinstance(dtype, dict):
+            # The categories of the whole table, not only those of the rows read
+            df[col] = df[col].astype(pd.CategoricalDtype(dtype['categories'], ordered=dtype['ordered']))
+        elif dtype == 'object':
+            # NULL comes back as None; the in-memory tables hold NaN
+            df[col] = df[col].astype(object).where(df[col].notna(), np.nan)
+        else:
+            df[col] = df[col].astype(dtype)
+    return df
+
+
+class SqliteDataset:
+    """
+    Read-only dataset in an SQLite database written by write_sqlite_dataset.
+    Shared across threads: each thread gets its own connection.
+    """
+
+    def __init__(self, path=DATASET_SQLITE, cache_mb=CACHE_MB):
+        self.path = path
+        self.cache_mb = cache_mb
+        self.local = threading.local()
+        self.dtypes = {name: json.loads(dtypes) for name, dtypes in self.query('SELECT name, dtypes FROM meta')}
+        # Databases written before LINK_YEAR_COLUMN join the publications for their year
+        self.link_year = f'l.{LINK_YEAR_COLUMN}' if self.dtypes['links'].pop(LINK_YEAR_COLUMN, None) else 'p.year'
+        self.proteins = self.read_table('SELECT * FROM proteins ORDER BY row_index', 'proteins')
+        first_year, last_year = self.query('SELECT MIN(year), MAX(year) FROM publications')[0]
+        # Same as summary_years of the in-memory store
+        self.year_range = (0, 0) if first_year is None else (int(first_year), int(last_year))
+
+    @property
+    def connection(self):
+        if getattr(self.local, 'connection', None) is None:
+            con = sqlite3.connect(f"file:{os.path.abspath(self.path)}?mode=ro", uri=True)
+            con.execute(f'PRAGMA cache_size = -{self.cache_mb * 1024}')
+            self.local.connection = con
+        return self.local.connection
+
+    def query(self, sql, params=()):
+        return self.connection.execute(sql, params).fetchall()
+
+    def read_table(self, sql, name, params=()):
+        df = pd.read_sql_query(sql, self.connection, params=params, index_col=ROW_COLUMN)
+        df.index.name = None
+        return restore_dtypes(df, self.dtypes[name])
+
+    def has_column(self, table, column):
+        return column in self.dtypes[table]
+
+    def filter_bounds(self, df):
+        """Same as biocurator_data.filter_bounds, with the fraction and year ranges computed by SQLite"""
+        uniprot_ids = df['uniprot_id'].tolist()
+        fractions, years = [], []
+        for start in range(0, len(uniprot_ids), AGGREGATE_PROTEINS):
+            chunk = uniprot_ids[start:start + AGGREGATE_PROTEINS]
+            (min_fraction, max_fraction, min_year, max_year), = self.query(f'''
+                SELECT MIN(l.fraction_mentions), MAX(l.fraction_mentions), MIN({self.link_year}), MAX({self.link_year})
+                FROM {self.links_from}
+                WHERE l.uniprot_id IN ({", ".join("?" * len(chunk))})
+            ''', chunk)
+            if min_year is not None:
+                fractions += [min_fraction, max_fraction]
+                years += [min_year, max_year]
+        if not years:
+            return None
+        return {
+            'fraction': (max(0.0, float(min(fractions))), min(1.0, float(max(fractions)))),
+            'year': (int(min(years)), int(max(years))),
+            'last_reviewed': (int(df['last_reviewed_pubyear'].min()), int(df['last_reviewed_pubyear'].max())),
+        }
+
+    @property
+    def links_from(self):
+        """FROM clause of the link queries: the links l, joined to their publications p for their year if needed"""
+        return 'links l' if self.link_year != 'p.year' else 'links l JOIN publications p ON p.pmid = l.pmid'
+
+    def link_conditions(self, uniprot_ids, filters):
+        """
+        WHERE clause and parameters selecting the links (l, see links_from) of the given proteins
+        that pass the fraction, year and new_only filters
+        """
+        conditions = [
+            f'l.uniprot_id IN ({", ".join("?" * len(uniprot_ids))})',
+            'l.fraction_mentions BETWEEN ? AND ?',
+            f'{self.link_year} BETWEEN ? AND ?',
+        ]
+        if filters.new_only and self.has_column('links', NEW_SINCE_RELEASE):
+            conditions.append(f'l.{NEW_SINCE_RELEASE}')
+        return " AND ".join(conditions), list(uniprot_ids) + [
+            float(filters.min_fraction), float(filters.max_fraction), int(filters.min_year), int(filters.max_year)
+        ]
+
+    def select(self, uniprot_ids, filters):
+        """
+        PublicationStore of the links of the given proteins that pass the fraction, year and
+        new_only filters, and of their publications. The links keep their in-memory index and order.
+        """
+        link_columns = list(self.dtypes['links'])
+        publication_columns = [col for col in self.dtypes['publications'] if col != 'pmid']
+        where, params = self.link_conditions(uniprot_ids, filters)
+        rows = self.read_table(f'''
+            SELECT l.{ROW_COLUMN}, {", ".join(f'l."{col}"' for col in link_columns)},
+                   {", ".join(f'p."{col}"' for col in publication_columns)}
+            FROM links l JOIN publications p ON p.pmid = l.pmid
+            WHERE {where}
+            ORDER BY l.{ROW_COLUMN}
+        ''', 'links', params=params)
+        links = rows[link_columns]
+        publications = restore_dtypes(
+            rows.drop_duplicates('pmid')[['pmid'] + publication_columns].sort_values('pmid').reset_index(drop=True),
+            self.dtypes['publications']
+        )
+        links['pub_row'] = publications['pmid'].searchsorted(links['pmid']).astype('int32')
+        return PublicationStore(publications, links)
+
+    def iter_chunks(self, uniprot_ids, filters, chunk_size=CHUNK_PROTEINS):
+        """Yield (PublicationStore, filtered links) for chunk_size proteins at a time (one empty chunk for no proteins)"""
+        uniprot_ids = list(uniprot_ids)
+        for start in range(0, max(len(uniprot_ids), 1), chunk_size):
+            store = self.select(uniprot_ids[start:start + chunk_size], filters)
+            yield store, select_links(store, store.links, filters)
+
+    def aggregate(self, uniprot_ids, filters, top=NUM_TOP_PUBLICATIONS):
+        """
+        Same link counts and protein_summaries as for the links selected by select, computed by
+        SQLite: only the per-year aggregates and the top publications of each protein are read.
+        The collapse_duplicates filter is not applied.
+
+        Returns:
+        - Series of the number of links per protein with links
+        - DataFrame of protein_summaries
+        """
+        where, params = self.link_conditions(uniprot_ids, filters)
+        per_year = pd.read_sql_query(f'''
+            SELECT l.uniprot_id, {self.link_year} AS year, COUNT(*) AS count,
+                   MAX(l.fraction_mentions) AS max_fraction, TOTAL(l.fraction_mentions) AS total_fraction,
+                   TOTAL(l.in_title) AS in_title_count
+            FROM {self.links_from}
+            WHERE {where}
+            GROUP BY l.uniprot_id, {self.link_year}
+        ''', self.connection, params=params)
+        title = 'p.title' if self.has_column('publications', 'title') else 'NULL'
+        # Same ranking as protein_summaries: in_title, then fraction_mentions, then most recent year, then PMID.
+        # Only the top links are joined to their publications for the title.
+        top_rows = pd.read_sql_query(f'''
+            SELECT t.uniprot_id, t.pmid, t.year, t.fraction_mentions, t.in_title, {title} AS title FROM (
+                SELECT l.uniprot_id, l.pmid, {self.link_year} AS year, l.fraction_mentions,
+                       COALESCE(l.in_title, 0) AS in_title,
+                       ROW_NUMBER() OVER (
+                           PARTITION BY l.uniprot_id
+                           ORDER BY COALESCE(l.in_title, 0) DESC, l.fraction_mentions DESC, {self.link_year} DESC, l.pmid
+                       ) AS rank
+                FROM {self.links_from}
+                WHERE {where}
+            ) t JOIN publications p ON p.pmid = t.pmid
+            WHERE t.rank <= ?
+            ORDER BY t.uniprot_id, t.rank
+        ''', self.connection, params=params + [top])
+
+        proteins, codes = np.unique(per_year['uniprot_id'].astype(str).values, return_inverse=True)
+        first_year, last_year = self.year_range
+        histogram = np.zeros((len(proteins), last_year - first_year + 1), dtype=np.int32)
+        histogram[codes, per_year['year'].values.astype(np.int64) - first_year] = per_year['count'].values
+        counts = np.bincount(codes, weights=per_year['count'], minlength=len(proteins)).astype(int)
+        max_fraction = np.full(len(proteins), -np.inf)
+        np.maximum.at(max_fraction, codes, per_year['max_fraction'].values.astype(float))
+        records = top_rows.astype({
+            'pmid': np.int64, 'year': np.int64, 'fraction_mentions': float, 'in_title': bool
+        }).drop(columns='uniprot_id')
+        records = records.astype(object).where(records.notna(), None).to_dict('records')
+        bounds = np.r_[0, np.cumsum(np.minimum(counts, top))]
+        summaries = pd.DataFrame({
+            'year_histogram': list(histogram),
+            'max_fraction': max_fraction,
+            'mean_fraction': np.bincount(codes, weights=per_year['total_fraction'], minlength=len(proteins)) / counts,
+            'in_title_count': np.bincount(codes, weights=per_year['in_title_count'], minlength=len(proteins)).astype(int),
+            'top_publications': [records[start:stop] for start, stop in zip(bounds[:-1], bounds[1:])],
+        }, index=pd.Index(proteins, name='uniprot_id'))
+        return pd.Series(counts, index=proteins, name='count'), summaries[SUMMARY_COLUMNS]
+
+    def grid_view(self, filters):
+        """
+        Same proteins as filter_dataset followed by add_protein_summaries, without loading every link.
+        The counts and summaries are aggregated by SQLite; only collapsing near-duplicates
+        needs the links, which are then read a chunk of proteins at a time.
+
+        Returns:
+        - DataFrame of the proteins to display, with their summary columns
+        - number of filtered publications (one per protein and PMID)
+        - number of proteins with filtered publications
+        """
+        df = filter_proteins(self.proteins, filters)
+        counts, summaries = [], []
+        if filters.collapse_duplicates and self.has_column('publications', 'canonical_pmid'):
+            for store, links in self.iter_chunks(df['uniprot_id'], filters):
+                counts.append(links['uniprot_id'].value_counts())
+                summaries.append(protein_summaries(store, links, year_range=self.year_range))
+        else:
+            uniprot_ids = df['uniprot_id'].tolist()
+            for start in range(0, max(len(uniprot_ids), 1), AGGREGATE_PROTEINS):
+                link_count, summary = self.aggregate(uniprot_ids[start:start + AGGREGATE_PROTEINS], filters)
+                counts.append(link_count)
+                summaries.append(summary)
+        link_counts = pd.concat(counts)
+        df = count_publications(df, link_counts, filters)
+        return add_protein_summaries(df, pd.concat(summaries)), int(link_counts.sum()), int((link_counts > 0).sum())
+
+    def protein_publications(self, uniprot_id, filters):
+        """Filtered publications of one protein, as joined by join_publications, in display order"""
+        store, links = next(self.iter_chunks([uniprot_id], filters))
+        return join_publications(store, links)
+
+    def iter_publication_chunks(self, df, filters, chunk_size=CHUNK_PROTEINS):
+        """Same chunks as biocurator_export.iter_publication_chunks over the filtered links of the proteins in df"""
+        for start in range(0, len(df), chunk_size):
+            chunk = df.iloc[start:start + chunk_size]
+            store, links = next(self.iter_chunks(chunk['uniprot_id'], filters, chunk_size))
+            yield from iter_publication_chunks(chunk, store, links, chunk_size)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--data", default=PUBTATOR_PICKLE, help="Path to the pubtator pickle")
+    parser.add_argument("--out", default=DATASET_SQLITE, help="Output SQLite database")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    non_nd_df, store = load_dataset(args.data)
+    write_sqlite_dataset(non_nd_df, store, args.out)
+    print(f"Wrote {len(non_nd_df)} proteins, {len(store.publications)} publications and {len(store.links)} links "
+          f"to {args.out} ({time.perf_counter() - start:.1f}s)")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,55 +1,46 @@
+import os
 from pathlib import Path
 
+# Get base paths from environment variables or use defaults
+data_dir = os.environ.get("PROTEIN_DATA_DIR")
+output_dir = os.environ.get("PROTEIN_OUTPUT_DIR")
+
 # Base paths
-DATA_DIR = Path("/home/ahphan/RotationData/Friedberg/ign_exp_0628/protein-annotation-bias/0_data")
-OUTPUT_DIR = Path("/home/ahphan/RotationData/Friedberg/ign_exp_0628/protein-annotation-bias/output")
+DATA_DIR = Path(data_dir) if data_dir else Path("data")
+OUTPUT_DIR = Path(output_dir) if output_dir else Path("output")
 
 # Ensure directories exist
 OUTPUT_DIR.mkdir(parents=True, exist_ok=True)
 
-# Input files
+# Input files - use environment variables if provided
 # GAF_FILE = DATA_DIR / "03Nov24goa_human.gaf"
-GAF_FILE = ""
-DAT_FILE = DATA_DIR / "ext_data/uniprot_sprot_human.dat"
-IDMAPPING_FILE = DATA_DIR / "ext_data/HUMAN_9606_idmapping.dat"
+GAF_FILE = Path(os.environ.get("GAF_FILE")) if os.environ.get("GAF_FILE") else ""
+DAT_FILE = Path(os.environ.get("DAT_FILE")) if os.environ.get("DAT_FILE") else DATA_DIR / "ext_data/uniprot_sprot_human.dat"
+IDMAPPING_FILE = Path(os.environ.get("IDMAPPING_FILE")) if os.environ.get("IDMAPPING_FILE") else \
+    DATA_DIR / "ext_data/HUMAN_9606_idmapping.dat"
+# Inputs of the pipeline.py stages, separated by os.pathsep when several files are given
+PUBTATOR_BIOC_FILES = [Path(path) for path in os.environ.get("PUBTATOR_BIOC_FILES", "").split(os.pathsep) if path]
+GENE2PUBTATOR_FILES = [Path(path) for path in os.environ.get("GENE2PUBTATOR_FILES", "").split(os.pathsep) if path]
+PREVIOUS_PUBTATOR_PICKLE = Path(os.environ.get("PREVIOUS_PUBTATOR_PICKLE")) \
+    if os.environ.get("PREVIOUS_PUBTATOR_PICKLE") else None
+# Protein table read by the ingest stage (a pubtator pickle or a TSV); kept apart from
+# PUBTATOR_PICKLE, which the ingest stage writes
+PROTEIN_TABLE = Path(os.environ.get("PROTEIN_TABLE")) if os.environ.get("PROTEIN_TABLE") else \
+    DATA_DIR / "protein_table.pkl"
 
 # Output files
 ND_PROTEINS_OUTPUT = OUTPUT_DIR / "ND_proteins.tsv"
 IGNORED_PROTEINS_OUTPUT = OUTPUT_DIR / "ignored_proteins.tsv"
 PUBTATOR_PICKLE = OUTPUT_DIR / "pubtator_pubs.pkl"
 OUTPUT_PUBS = OUTPUT_DIR / "potential_pubs.tsv"
+AMBIGUITY_SCORES_OUTPUT = OUTPUT_DIR / "ambiguity_scores.tsv"
+RELEASE_DIFF_PROTEINS_OUTPUT = OUTPUT_DIR / "release_diff_proteins.tsv"
+RELEASE_DIFF_PUBLICATIONS_OUTPUT = OUTPUT_DIR / "release_diff_publications.tsv"
+DATASET_ARROW_OUTPUT = OUTPUT_DIR / "dataset_arrow"
+DATASET_SQLITE_OUTPUT = OUTPUT_DIR / "dataset.sqlite"
 
 # API Configuration
 UNIPROT_API_BASE = "https://rest.uniprot.org/uniprotkb/"
-API_RATE_LIMIT = 0.3  # seconds between requests
-
-# # Updating path configs
-# import os
-# from pathlib import Path
-
-# # Get base paths from environment variables or use defaults
-# data_dir = os.environ.get("PROTEIN_DATA_DIR")
-# output_dir = os.environ.get("PROTEIN_OUTPUT_DIR")
-
-# # Base paths
-# DATA_DIR = Path(data_dir) if data_dir else Path("data")
-# OUTPUT_DIR = Path(output_dir) if output_dir else Path("output")
-
-# # Ensure directories exist
-# OUTPUT_DIR.mkdir(parents=True, exist_ok=True)
-
-# # Input files - use environment variables if provided
-# GAF_FILE = Path(os.environ.get("GAF_FILE")) if os.environ.get("GAF_FILE") else DATA_DIR / "goa_human.gaf"
-# DAT_FILE = Path(os.environ.get("DAT_FILE")) if os.environ.get("DAT_FILE") else DATA_DIR / "uniprot_sprot_human.dat"
-# IDMAPPING_FILE = Path(os.environ.get("IDMAPPING_FILE")) if os.environ.get("IDMAPPING_FILE") else DATA_DIR / "human_idmapping.txt"
-
-# # Output files
-# ND_PROTEINS_OUTPUT = OUTPUT_DIR / "ND_proteins_{date}.tsv"
-# IGNORED_PROTEINS_OUTPUT = OUTPUT_DIR / "ignored_proteins_{date}.tsv"
-# PUBTATOR_PICKLE = OUTPUT_DIR / "pubtator_pubs.pkl"
-
-# # API Configuration
-# UNIPROT_API_BASE = "https://rest.uniprot.org/uniprotkb/"
-# API_RATE_LIMIT = float(os.environ.get("API_RATE_LIMIT", "0.3"))  # seconds between requests
+API_RATE_LIMIT = float(os.environ.get("API_RATE_LIMIT", "0.3"))  # seconds between requests
 
 # review the python files in 7_website, ignore the R scripts. i want to extract nd proteins (then write out a file), then for each protein in the previous step, fetch the pubtato information on it (then store in a pickle file). FInally, the streamlit app reads the pickle file and display the data. What is the most optimal way to do the preprocessing (knowing that 2 files will be provided as raw input), and deploying the website, if i were to (1) give this code to someone else to run on their local machine and host website locally and (2) host this website on another server (like AWS)
\ No newline at end of file
@@ -0,0 +1,308 @@
+"""
+Incremental runs of the data pipeline as a small stage graph.
+
+Each stage is one of the pipeline scripts, with the files it reads and writes
+taken from paths_config.py (configurable through environment variables):
+
+    python pipeline.py [--bioc BioCXML.*.tar.gz] [--gene2pubtator gene2pubtator3.gz] [--previous old/pubtator_pubs.pkl]
+
+- ingest: PubTator BioC dumps and the protein table -> PUBTATOR_PICKLE (pubtator_ingest.py)
+- ambiguity: gene2pubtator mentions and PUBTATOR_PICKLE -> alias ambiguity scores (alias_ambiguity.py)
+- release_diff: previous snapshot and PUBTATOR_PICKLE -> release diff TSVs (release_diff.py)
+- export: PUBTATOR_PICKLE -> OUTPUT_PUBS (biocurator_export.py)
+- arrow: PUBTATOR_PICKLE, scores and release diff -> memory-mapped dataset (serve_multi.py)
+- sqlite: PUBTATOR_PICKLE, scores and release diff -> out-of-core dataset (biocurator_sqlite.py)
+
+Stages without their external inputs (no BioC dumps, mentions or previous
+snapshot given) are left out. A stage depends on the stages writing its input
+files. Its key is a hash of the contents of its inputs, of its script and the
+local modules it imports, and of its parameters: it is skipped when the key and
+its outputs are unchanged since its last successful run. Stages whose inputs
+are ready run in parallel, each in its own process, and a per-stage timing
+report is printed at the end. File hashes are cached by size and modification
+time, so unchanged multi-GB inputs are not read again.
+"""
+import argparse
+import ast
+import hashlib
+import json
+import os
+import subprocess
+import sys
+import threading
+import time
+from collections import namedtuple
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+import paths_config
+
+STATE_FILE = paths_config.OUTPUT_DIR / ".pipeline_state.json"
+LOG_DIR = paths_config.OUTPUT_DIR / "pipeline_logs"
+SOURCE_DIR = os.path.dirname(os.path.abspath(__file__))
+HASH_BLOCK_SIZE = 1 << 20
+
+# args are hashed into the key of the stage, options (e.g. the number of workers) are not
+Stage = namedtuple('Stage', ['name', 'script', 'args', 'inputs', 'outputs', 'options'], defaults=[()])
+
+
+def pipeline_stages(bioc, gene2pubtator, previous, proteins, workers=None):
+    """Stages configured for the given external inputs, in topological order"""
+    pickle = str(paths_config.PUBTATOR_PICKLE)
+    ambiguity = str(paths_config.AMBIGUITY_SCORES_OUTPUT)
+    diff = [str(paths_config.RELEASE_DIFF_PROTEINS_OUTPUT), str(paths_config.RELEASE_DIFF_PUBLICATIONS_OUTPUT)]
+    stages = []
+    if bioc:
+        stages.append(Stage(
+            'ingest', 'pubtator_ingest.py', list(bioc) + ['--proteins', proteins, '--out', pickle],
+            inputs=list(bioc) + [proteins], outputs=[pickle],
+            options=['--workers', str(workers)] if workers else [],
+        ))
+    if gene2pubtator:
+        stages.append(Stage(
+            'ambiguity', 'alias_ambiguity.py', list(gene2pubtator) + ['--data', pickle, '--out', ambiguity],
+            inputs=list(gene2pubtator) + [pickle], outputs=[ambiguity],
+        ))
+    if previous:
+        stages.append(Stage(
+            'release_diff', 'release_diff.py',
+            [previous, pickle, '--proteins-out', diff[0], '--publications-out', diff[1]],
+            inputs=[previous, pickle], outputs=diff,
+        ))
+    stages.append(Stage(
+        'export', 'biocurator_export.py', ['--data', pickle, '--out', str(paths_config.OUTPUT_PUBS)],
+        inputs=[pickle], outputs=[str(paths_config.OUTPUT_PUBS)],
+    ))
+    # The app merges the scores and the release diff when they exist
+    stages.append(Stage(
+        'arrow', 'serve_multi.py',
+        ['--prepare-only', '--data', pickle, '--arrow-dir', str(paths_config.DATASET_ARROW_OUTPUT)],
+        inputs=[pickle, ambiguity] + diff, outputs=[str(paths_config.DATASET_ARROW_OUTPUT)],
+    ))
+    stages.append(Stage(
+        'sqlite', 'biocurator_sqlite.py', ['--data', pickle, '--out', str(paths_config.DATASET_SQLITE_OUTPUT)],
+        inputs=[pickle, ambiguity] + diff, outputs=[str(paths_config.DATASET_SQLITE_OUTPUT)],
+    ))
+    return stages
+
+
+def stage_dependencies(stages):
+    """Names of the stages writing an input of each stage"""
+    writers = {output: stage.name for stage in stages for output in stage.outputs}
+    return {
+        stage.name: {writers[path] for path in stage.inputs if path in writers and writers[path] != stage.name}
+        for stage in stages
+    }
+
+
+def local_sources(script, directory=SOURCE_DIR):
+    """The script and the modules of this repository it imports, directly or not"""
+    sources, pending = set(), [os.path.join(directory, script)]
+    while pending:
+        path = pending.pop()
+        if path in sources or not os.path.exists(path):
+            continue
+        sources.add(path)
+        with open(path) as fh:
+            tree = ast.parse(fh.read())
+        for node in ast.walk(tree):
+            if isinstance(node, ast.Import):
+                names = [alias.name for alias in node.names]
+            elif isinstance(node, ast.ImportFrom) and node.module and not node.level:
+                names = [node.module]
+            else:
+                continue
+            pending.extend(os.path.join(directory, name.split('.')[0] + ".py") for name in names)
+    return sorted(sources)
+
+
+class HashCache:
+    """
+    Content hashes of files and directories, cached by path, size and modification time.
+    Shared by the threads running the stages.
+    """
+
+    def __init__(self, entries=None):
+        self.entries = dict(entries or {})
+        self.lock = threading.Lock()
+
+    def snapshot(self):
+        with self.lock:
+            return dict(self.entries)
+
+    def file_digest(self, path):
+        stat = os.stat(path)
+        signature = [stat.st_size, stat.st_mtime_ns]
+        with self.lock:
+            entry = self.entries.get(path)
+        if entry is not None and entry[:2] == signature:
+            return entry[2]
+        digest = hashlib.sha256()
+        with open(path, "rb") as fh:
+            for block in iter(lambda: fh.read(HASH_BLOCK_SIZE), b''):
+                digest.update(block)
+        with self.lock:
+            self.entries[path] = signature + [digest.hexdigest()]
+        return digest.hexdigest()
+
+    def digest(self, path):
+        """Hash of a file, of the files of a directory (with their relative paths), or None if it does not exist"""
+        path = str(path)
+        if os.path.isdir(path):
+            digest = hashlib.sha256()
+            for root, dirs, files in os.walk(path):
+                dirs.sort()
+                for name in sorted(files):
+                    file_path = os.path.join(root, name)
+                    digest.update(os.path.relpath(file_path, path).encode() + b'\0')
+                    digest.update(self.file_digest(file_path).encode())
+            return digest.hexdigest()
+        if os.path.exists(path):
+            return self.file_digest(path)
+        return None
+
+
+def stage_key(stage, hashes):
+    """Hash of the parameters, code and input contents of a stage"""
+    digest = hashlib.sha256(json.dumps([stage.script, stage.args]).encode())
+    # A stage updating a file in place does not depend on its own output
+    inputs = [path for path in stage.inputs if path not in stage.outputs]
+    for path in local_sources(stage.script):
+        digest.update(f"{os.path.relpath(path, SOURCE_DIR)}\0{hashes.digest(path)}\0".encode())
+    for path in inputs:
+        digest.update(f"{path}\0{hashes.digest(path)}\0".encode())
+    return digest.hexdigest()
+
+
+def load_state(path=STATE_FILE):
+    if os.path.exists(path):
+        with open(path) as fh:
+            return json.load(fh)
+    return {'files': {}, 'stages': {}}
+
+
+def save_state(state, path=STATE_FILE):
+    with open(f"{path}.tmp", "w") as fh:
+        json.dump(state, fh, indent=1)
+    os.replace(f"{path}.tmp", path)
+
+
+def is_up_to_date(stage, key, state, hashes):
+    """Whether the last successful run of the stage had the same key and its outputs are unchanged since"""
+    record = state['stages'].get(stage.name)
+    return record is not None and record['key'] == key and all(
+        record['outputs'].get(path) is not None and hashes.digest(path) == record['outputs'][path]
+        for path in stage.outputs
+    )
+
+
+def run_stage(stage, log_dir=LOG_DIR):
+    """Run the script of a stage, with its output in the stage's log file. Returns the exit code."""
+    os.makedirs(log_dir, exist_ok=True)
+    command = [sys.executable, os.path.join(SOURCE_DIR, stage.script)] + list(stage.args) + list(stage.options)
+    with open(os.path.join(log_dir, f"{stage.name}.log"), "w") as log:
+        return subprocess.run(command, stdout=log, stderr=subprocess.STDOUT).returncode
+
+
+def run_pipeline(stages, jobs=None, force=(), dry_run=False):
+    """
+    Run the stages that are out of date, in parallel as soon as the stages they depend on are done.
+
+    Returns:
+    - dictionary of stage name to (status, seconds), with status one of
+      'ran', 'skipped', 'failed', 'blocked' (a dependency failed) or 'would run' (dry run)
+    """
+    state = load_state()
+    hashes = HashCache(state['files'])
+    dependencies = stage_dependencies(stages)
+    by_name = {stage.name: stage for stage in stages}
+    results = {}
+    # Without running, the outputs of a stage that would run are unknown: the stages after it would run too
+    would_run = set()
+
+    def process(stage):
+        start = time.perf_counter()
+        key = stage_key(stage, hashes)
+        if stage.name not in force and not (dependencies[stage.name] & would_run) and \
+                is_up_to_date(stage, key, state, hashes):
+            return 'skipped', key, time.perf_counter() - start
+        if dry_run:
+            return 'would run', key, time.perf_counter() - start
+        code = run_stage(stage)
+        return ('ran' if code == 0 else 'failed'), key, time.perf_counter() - start
+
+    pending = dict(dependencies)
+    with ThreadPoolExecutor(max_workers=jobs or os.cpu_count()) as executor:
+        running = {}
+        while pending or running:
+            for name in [name for name, deps in pending.items() if deps <= set(results)]:
+                del pending[name]
+                if any(results[dep][0] in ('failed', 'blocked') for dep in dependencies[name]):
+                    results[name] = ('blocked', 0.0)
+                    continue
+                running[executor.submit(process, by_name[name])] = name
+            if not running:
+                continue
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                name = running.pop(future)
+                status, key, seconds = future.result()
+                results[name] = (status, seconds)
+                if status == 'would run':
+                    would_run.add(name)
+                if status == 'ran':
+                    stage = by_name[name]
+                    state['stages'][name] = {
+                        'key': key, 'outputs': {path: hashes.digest(path) for path in stage.outputs}
+                    }
+                    state['files'] = hashes.snapshot()
+                    save_state(state)
+    state['files'] = hashes.snapshot()
+    if not dry_run:
+        save_state(state)
+    return results
+
+
+def print_report(stages, results, total_seconds):
+    width = max(len(stage.name) for stage in stages)
+    print("Pipeline stages:")
+    for stage in stages:
+        status, seconds = results[stage.name]
+        print(f"  {stage.name:<{width}}  {status:<9}  {seconds:8.1f} s")
+    print(f"  {'total':<{width}}  {'':<9}  {total_seconds:8.1f} s")
+    failed = [stage.name for stage in stages if results[stage.name][0] == 'failed']
+    if failed:
+        print(f"Failed: {', '.join(failed)} (see the logs in {LOG_DIR})")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--bioc", nargs="+", default=[str(path) for path in paths_config.PUBTATOR_BIOC_FILES],
+                        help="PubTator BioC dumps for the ingest stage (default: $PUBTATOR_BIOC_FILES)")
+    parser.add_argument("--proteins", default=str(paths_config.PROTEIN_TABLE),
+                        help="Protein table of the ingest stage: a pubtator pickle or a TSV (default: $PROTEIN_TABLE)")
+    parser.add_argument("--gene2pubtator", nargs="+", default=[str(path) for path in paths_config.GENE2PUBTATOR_FILES],
+                        help="gene2pubtator files for the ambiguity stage (default: $GENE2PUBTATOR_FILES)")
+    parser.add_argument("--previous", default=str(paths_config.PREVIOUS_PUBTATOR_PICKLE or '') or None,
+                        help="Pubtator pickle of the previous snapshot for the release_diff stage "
+                             "(default: $PREVIOUS_PUBTATOR_PICKLE)")
+    parser.add_argument("--workers", type=int, help="Worker processes of the ingest stage")
+    parser.add_argument("--jobs", type=int, default=None, help="Stages run at the same time (default: one per CPU)")
+    parser.add_argument("--force", nargs="+", default=[], help="Stages to run even if they are up to date")
+    parser.add_argument("--dry-run", action="store_true", help="Only report the stages that would run")
+    args = parser.parse_args()
+    if args.bioc and os.path.abspath(args.proteins) == os.path.abspath(paths_config.PUBTATOR_PICKLE):
+        parser.error(f"the ingest stage writes {paths_config.PUBTATOR_PICKLE}; its protein table must be another file")
+
+    stages = pipeline_stages(args.bioc, args.gene2pubtator, args.previous, args.proteins, args.workers)
+    unknown = set(args.force) - {stage.name for stage in stages}
+    if unknown:
+        parser.error(f"Unknown or unconfigured stages: {', '.join(sorted(unknown))}")
+    start = time.perf_counter()
+    results = run_pipeline(stages, args.jobs, set(args.force), args.dry_run)
+    print_report(stages, results, time.perf_counter() - start)
+    if any(status == 'failed' for status, _ in results.values()):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
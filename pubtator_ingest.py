@@ -0,0 +1,301 @@
+"""
+Offline ingestion of PubTator bulk BioC dumps.
+
+Builds the publications dataset from locally downloaded PubTator BioC XML
+files (BioCXML.*.tar.gz archives, or .xml/.xml.gz files) instead of calling
+the PubTator API once per gene. No network access is needed:
+
+    python pubtator_ingest.py BioCXML.*.tar.gz --workers 8
+
+Each file is handled by its own worker process. The file is decompressed in
+a separate pigz/gzip process, so decompression runs alongside XML parsing.
+Documents are screened on their raw annotation identifiers against the set of
+NCBI GeneIDs in the protein table, and only the matching ones are parsed. For
+these, the per-(protein, PMID) metrics are computed directly from the gene
+annotations: fraction_mentions, in_title and total_genes.
+
+The protein table is read from an existing pubtator pickle (default) or a
+TSV, and the output pickle has the same (non_nd_df, unreviewed_dict) layout
+that the app loads.
+"""
+import argparse
+import gzip
+import os
+import pickle as cp
+import re
+import shutil
+import subprocess
+import tarfile
+import time
+import xml.etree.ElementTree as ET
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
+
+import numpy as np
+import pandas as pd
+
+from biocurator_data import PUBTATOR_PICKLE
+from release_diff import PMID_BITS, anti_join, link_keys
+from title_dedup import add_canonical_pmids
+
+MENTION_COLUMNS = ['gene', 'pmid', 'in_title', 'fraction_mentions', 'total_genes',
+                   'year', 'journal', 'full_text', 'title']
+# Columns of the per-protein publication tables in the pickle, in the original order
+PUBLICATION_TABLE_COLUMNS = ['pmid', 'year', 'in_title', 'fraction_mentions', 'total_genes',
+                             'journal', 'full_text', 'title']
+TITLE_SECTIONS = {'title', 'front'}
+DOCUMENT_END = b'</document>'
+IDENTIFIER = re.compile(rb'<infon key="identifier">([^<]*)</infon>')
+GENE_SEPARATOR = re.compile(rb'\s*[;,]\s*')
+# Genes with more publications than this are flagged with ambiguous_mapping
+AMBIGUOUS_PUBLICATIONS = 1000
+
+
+@contextmanager
+def open_decompressed(path):
+    """
+    Binary stream of a possibly gzipped file. Gzipped files are decompressed by
+    pigz (or gzip) in a child process so decompression overlaps with parsing.
+    """
+    path = str(path)
+    if not path.endswith('.gz'):
+        with open(path, 'rb') as fh:
+            yield fh
+        return
+    decompressor = shutil.which('pigz') or shutil.which('gzip')
+    if decompressor is None:
+        with gzip.open(path, 'rb') as fh:
+            yield fh
+        return
+    proc = subprocess.Popen([decompressor, '-dc', path], stdout=subprocess.PIPE, bufsize=1 << 20)
+    try:
+        yield proc.stdout
+    finally:
+        proc.stdout.close()
+        if proc.wait() not in (0, -13):  # -13: SIGPIPE when we stop reading early
+            raise IOError(f"{decompressor} failed to decompress {path}")
+
+
+def iter_xml_streams(path):
+    """Yield a binary stream per BioC XML document file in path (a tar archive or a single file)"""
+    with open_decompressed(path) as stream:
+        if '.tar' in str(path):
+            with tarfile.open(fileobj=stream, mode='r|') as archive:
+                for member in archive:
+                    if member.isfile() and member.name.endswith('.xml'):
+                        yield archive.extractfile(member)
+        else:
+            yield stream
+
+
+def infons(element):
+    return {infon.get('key'): infon.text for infon in element.findall('infon')}
+
+
+def document_mentions(document, target_genes):
+    """
+    Mention metrics of the target genes annotated in one BioC document.
+
+    Returns:
+    - list of MENTION_COLUMNS tuples, one per target gene, or an empty list
+    """
+    pmid = year = journal = None
+    title = ''
+    full_text = False
+    gene_mentions = Counter()
+    title_genes = set()
+    total_mentions = 0
+    for passage in document.iter('passage'):
+        passage_infons = infons(passage)
+        section = (passage_infons.get('section_type') or passage_infons.get('type') or '').lower()
+        pmid = pmid or passage_infons.get('article-id_pmid')
+        year = year or passage_infons.get('year')
+        journal = journal or passage_infons.get('journal')
+        in_title = section in TITLE_SECTIONS
+        if in_title and not title:
+            title = passage.findtext('text') or ''
+        elif not in_title and not section.startswith('abstract'):
+            full_text = True
+        for annotation in passage.iter('annotation'):
+            annotation_infons = infons(annotation)
+            if annotation_infons.get('type') != 'Gene':
+                continue
+            total_mentions += 1
+            for gene in re.split(r'[;,]', annotation_infons.get('identifier') or ''):
+                gene = gene.strip()
+                if gene:
+                    gene_mentions[gene] += 1
+                    if in_title:
+                        title_genes.add(gene)
+
+    targets = [gene for gene in gene_mentions if gene in target_genes]
+    if not targets:
+        return []
+    pmid = pmid or document.findtext('id')
+    if year is None and journal:
+        match = re.search(r'\b(1[89]|20)\d\d\b', journal)
+        year = match.group(0) if match else None
+    if not pmid or not pmid.isdigit() or not year:
+        return []
+    journal = journal.split(';')[0].strip().rstrip('.') if journal else ''
+    return [
+        (gene, pmid, gene in title_genes, round(gene_mentions[gene] / total_mentions, 4),
+         len(gene_mentions), year, journal, full_text, title)
+        for gene in targets
+    ]
+
+
+def iter_documents(stream, block_size=1 << 22):
+    """Yield the raw bytes of each <document> element of a BioC XML stream"""
+    buffer = b''
+    while True:
+        block = stream.read(block_size)
+        if not block:
+            break
+        parts = (buffer + block).split(DOCUMENT_END)
+        buffer = parts.pop()
+        for part in parts:
+            start = part.find(b'<document')
+            if start >= 0:
+                yield part[start:] + DOCUMENT_END
+
+
+def scan_bioc_file(path, target_genes):
+    """
+    Stream one BioC file and return the MENTION_COLUMNS DataFrame of its documents that mention target genes.
+    Documents are screened on their raw annotation identifiers and only parsed when one is a target gene.
+    """
+    target_ids = {gene.encode() for gene in target_genes}
+    rows = []
+    for stream in iter_xml_streams(path):
+        for document in iter_documents(stream):
+            identifiers = b';'.join(IDENTIFIER.findall(document))
+            if identifiers and not target_ids.isdisjoint(GENE_SEPARATOR.split(identifiers)):
+                rows.extend(document_mentions(ET.fromstring(document), target_genes))
+    return pd.DataFrame(rows, columns=MENTION_COLUMNS)
+
+
+def scan_bioc_files(paths, target_genes, workers=None):
+    """Scan the BioC files in parallel, one worker process per file"""
+    target_genes = frozenset(target_genes)
+    if workers == 1 or len(paths) == 1:
+        frames = [scan_bioc_file(path, target_genes) for path in paths]
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            frames = list(executor.map(scan_bioc_file, paths, [target_genes] * len(paths)))
+    mentions = pd.concat(frames, ignore_index=True) if frames else pd.DataFrame(columns=MENTION_COLUMNS)
+    # A PMID can appear both as a PubMed abstract and a PMC full text: keep the full text
+    return mentions.sort_values('full_text', ascending=False, kind='stable').drop_duplicates(['gene', 'pmid'])
+
+
+def load_protein_table(path):
+    """Protein table from a pubtator pickle (its non_nd_df) or a TSV"""
+    if str(path).endswith('.pkl'):
+        with open(path, "rb") as fh:
+            return cp.load(fh)[0]
+    return pd.read_csv(path, sep="\t", header=0, dtype={'ncbi_gene': str})
+
+
+def parse_pmid_lists(texts):
+    """
+    PMIDs listed in each text, as every run of ASCII digits (like str.findall(r'\\d+')).
+    The texts are scanned as one byte buffer instead of one Python list per text.
+
+    Returns:
+    - array of the position of the text of each PMID
+    - int64 array of the PMIDs
+    """
+    texts = pd.Series(texts, dtype=object).fillna('').astype(str)
+    # One byte per character (non-ASCII characters become '?'), with a space between texts
+    buffer = np.frombuffer(' '.join(texts).encode('ascii', 'replace'), dtype=np.uint8)
+    text_starts = np.r_[0, np.cumsum(texts.str.len().values + 1)[:-1]].astype(np.int64)
+    is_digit = ((buffer >= ord('0')) & (buffer <= ord('9'))).astype(np.int8)
+    edges = np.flatnonzero(np.diff(np.r_[np.int8(0), is_digit, np.int8(0)]))
+    starts, lengths = edges[0::2], edges[1::2] - edges[0::2]
+    # Longer runs of digits overflow int64 and cannot be PMIDs
+    valid = lengths <= 18
+    starts, lengths = starts[valid], lengths[valid]
+    # Read the numbers one digit position at a time: at most 18 passes over the runs
+    values = np.zeros(len(starts), dtype=np.int64)
+    for offset in range(int(lengths.max()) if len(lengths) else 0):
+        more = lengths > offset
+        values[more] = values[more] * 10 + (buffer[starts[more] + offset] - ord('0'))
+    rows = np.searchsorted(text_starts, starts, side='right') - 1
+    return rows, values
+
+
+def reviewed_keys(non_nd_df, codes):
+    """int64 (protein code, PMID) keys of the publications listed in the reviewed_publications column"""
+    rows, pmids = parse_pmid_lists(non_nd_df['reviewed_publications'])
+    rows, pmids = rows[pmids < 1 << PMID_BITS], pmids[pmids < 1 << PMID_BITS]
+    protein_codes = codes.get_indexer(non_nd_df['uniprot_id'].astype(str)).astype(np.int64)[rows]
+    return (protein_codes << PMID_BITS) | pmids
+
+
+def build_dataset(non_nd_df, mentions):
+    """
+    Join gene mentions to the proteins and drop the publications already reviewed by UniProt.
+    Near-duplicate titles are clustered (see title_dedup.py).
+
+    Returns:
+    - DataFrame of the proteins with num_unreviewed_publications, num_total_PubTator
+      and ambiguous_mapping recomputed
+    - dictionary of uniprot_id -> DataFrame of its unreviewed publications, with canonical_pmid
+    """
+    non_nd_df = non_nd_df.copy()
+    proteins = non_nd_df[['uniprot_id', 'ncbi_gene']].astype(str)
+    links = proteins.merge(mentions, left_on='ncbi_gene', right_on='gene').drop(columns=['ncbi_gene', 'gene'])
+
+    # Anti-join on sorted int64 (protein code, PMID) keys (see release_diff.py)
+    codes = pd.Index(proteins['uniprot_id'].unique())
+    unreviewed_mask = anti_join(link_keys(links, codes), reviewed_keys(non_nd_df, codes))
+    total = links['uniprot_id'].value_counts()
+    unreviewed = links[unreviewed_mask]
+    unreviewed = unreviewed.sort_values(['uniprot_id', 'fraction_mentions'], ascending=[True, False])
+
+    non_nd_df['num_total_PubTator'] = non_nd_df['uniprot_id'].map(total).fillna(0).astype(float)
+    non_nd_df['num_unreviewed_publications'] = non_nd_df['uniprot_id'].map(
+        unreviewed['uniprot_id'].value_counts()
+    ).fillna(0).astype(int)
+    non_nd_df['ambiguous_mapping'] = non_nd_df['num_total_PubTator'] > AMBIGUOUS_PUBLICATIONS
+
+    unreviewed_dict = {
+        uniprot_id: pubs[PUBLICATION_TABLE_COLUMNS].reset_index(drop=True)
+        for uniprot_id, pubs in unreviewed.groupby('uniprot_id', sort=False)
+    }
+    add_canonical_pmids(unreviewed_dict)
+    return non_nd_df, unreviewed_dict
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("bioc", nargs="+", help="PubTator BioC XML files or archives (optionally gzipped)")
+    parser.add_argument("--proteins", default=PUBTATOR_PICKLE,
+                        help="Protein table: a pubtator pickle or a TSV with uniprot_id, ncbi_gene and reviewed_publications")
+    parser.add_argument("--out", help=f"Output pickle (default: {PUBTATOR_PICKLE})")
+    parser.add_argument("--workers", type=int, default=None, help="Number of worker processes (default: one per CPU)")
+    args = parser.parse_args()
+    # The protein table is replaced by the output only when asked for explicitly
+    if args.out is None:
+        if os.path.abspath(args.proteins) == os.path.abspath(PUBTATOR_PICKLE):
+            parser.error(f"the output would overwrite the protein table {args.proteins}: "
+                         f"pass --proteins with another table, or --out {PUBTATOR_PICKLE} to replace it")
+        args.out = PUBTATOR_PICKLE
+
+    start = time.perf_counter()
+    non_nd_df = load_protein_table(args.proteins)
+    target_genes = set(non_nd_df['ncbi_gene'].dropna().astype(str))
+    mentions = scan_bioc_files(args.bioc, target_genes, args.workers)
+    print(f"Found {len(mentions)} gene mentions of {mentions['gene'].nunique()}/{len(target_genes)} genes "
+          f"in {len(args.bioc)} files ({time.perf_counter() - start:.1f}s)")
+
+    non_nd_df, unreviewed_dict = build_dataset(non_nd_df, mentions)
+    with open(args.out, "wb") as fh:
+        cp.dump((non_nd_df, unreviewed_dict), fh)
+    print(f"Wrote {sum(len(pubs) for pubs in unreviewed_dict.values())} unreviewed publications "
+          f"of {len(unreviewed_dict)} proteins to {args.out}")
+
+
+if __name__ == "__main__":
+    main()
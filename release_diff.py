@@ -0,0 +1,106 @@
+"""
+Release-to-release diff of two dataset snapshots.
+
+Compares the pubtator pickle built from the previous SwissProt release or
+PubTator refresh with the current one and writes what changed:
+- output/release_diff_proteins.tsv: proteins that became unannotated
+  (new_unannotated) and proteins that gained annotations and left the
+  dataset (gained_annotations)
+- output/release_diff_publications.tsv: (uniprot_id, pmid) publications
+  added since the previous snapshot
+
+The app picks up both files and offers a "new since last release" filter:
+
+    python release_diff.py previous/pubtator_pubs.pkl output/pubtator_pubs.pkl
+
+Both snapshots are reduced to int64 keys (a protein code and, for
+publications, the PMID in the low 32 bits) and compared with a sort-merge
+anti-join, so full-corpus snapshots diff in O(n log n).
+"""
+import argparse
+import time
+
+import numpy as np
+import pandas as pd
+
+from biocurator_data import (PUBTATOR_PICKLE, RELEASE_DIFF_PROTEINS_TSV, RELEASE_DIFF_PUBLICATIONS_TSV,
+                             load_dataset)
+
+PMID_BITS = 32
+
+
+def anti_join(keys, other_keys):
+    """Boolean mask of the keys that are not in other_keys (sort-merge on int64 keys)"""
+    other_keys = np.sort(other_keys)
+    # Binary searches of sorted keys walk other_keys in order, which keeps them cache-friendly
+    order = np.argsort(keys)
+    sorted_keys = keys[order]
+    positions = np.searchsorted(other_keys, sorted_keys)
+    found = positions < len(other_keys)
+    found[found] = other_keys[positions[found]] == sorted_keys[found]
+    missing = np.empty(len(keys), dtype=bool)
+    missing[order] = ~found
+    return missing
+
+
+def link_keys(links, codes):
+    """int64 (protein code, PMID) keys of a links table"""
+    protein_codes = codes.get_indexer(links['uniprot_id'].astype(str)).astype(np.int64)
+    return (protein_codes << PMID_BITS) | links['pmid'].values.astype(np.int64)
+
+
+def diff_snapshots(old, new):
+    """
+    Diff two (non_nd_df, PublicationStore) snapshots, as returned by load_dataset.
+
+    Returns:
+    - DataFrame (uniprot_id, change) of the newly unannotated proteins and of the
+      proteins that gained annotations
+    - DataFrame (uniprot_id, pmid) of the publications added to the proteins of the new snapshot
+    """
+    (old_df, old_store), (new_df, new_store) = old, new
+    # One code per protein across both snapshots
+    codes = pd.Index(pd.unique(np.concatenate([
+        old_df['uniprot_id'].astype(str).values, new_df['uniprot_id'].astype(str).values,
+        old_store.links['uniprot_id'].astype(str).values, new_store.links['uniprot_id'].astype(str).values,
+    ])))
+    old_proteins = codes.get_indexer(old_df['uniprot_id'].astype(str)).astype(np.int64)
+    new_proteins = codes.get_indexer(new_df['uniprot_id'].astype(str)).astype(np.int64)
+    proteins = pd.concat([
+        pd.DataFrame({'uniprot_id': new_df['uniprot_id'].values[anti_join(new_proteins, old_proteins)],
+                      'change': 'new_unannotated'}),
+        pd.DataFrame({'uniprot_id': old_df['uniprot_id'].values[anti_join(old_proteins, new_proteins)],
+                      'change': 'gained_annotations'}),
+    ], ignore_index=True).drop_duplicates()
+
+    new_links = new_store.links
+    added = anti_join(link_keys(new_links, codes), link_keys(old_store.links, codes))
+    publications = new_links.loc[added, ['uniprot_id', 'pmid']].reset_index(drop=True)
+    return proteins, publications
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("old", help="Pubtator pickle of the previous snapshot")
+    parser.add_argument("new", nargs="?", default=PUBTATOR_PICKLE, help="Pubtator pickle of the current snapshot")
+    parser.add_argument("--proteins-out", default=RELEASE_DIFF_PROTEINS_TSV, help="Output TSV of changed proteins")
+    parser.add_argument("--publications-out", default=RELEASE_DIFF_PUBLICATIONS_TSV,
+                        help="Output TSV of added publications")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    # Compare the snapshots as loaded, without the flags of an earlier diff
+    old = load_dataset(args.old, ambiguity_path=None, release_diff_paths=None)
+    new = load_dataset(args.new, ambiguity_path=None, release_diff_paths=None)
+    proteins, publications = diff_snapshots(old, new)
+    proteins.to_csv(args.proteins_out, sep="\t", index=False)
+    publications.to_csv(args.publications_out, sep="\t", index=False)
+    counts = proteins['change'].value_counts()
+    print(f"{counts.get('new_unannotated', 0)} newly unannotated proteins, "
+          f"{counts.get('gained_annotations', 0)} proteins gained annotations, "
+          f"{len(publications)} new publications ({time.perf_counter() - start:.1f}s)")
+    print(f"Wrote {args.proteins_out} and {args.publications_out}")
+
+
+if __name__ == "__main__":
+    main()
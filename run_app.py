@@ -0,0 +1,77 @@
+"""
+Start the Streamlit app after a warm-up phase.
+
+Heavy imports, dataset loading and the default grid view are done before the
+server accepts connections, so the first visitor gets the same latency as
+every later one. Cold-start timings are printed at startup:
+
+    python run_app.py [streamlit run options, e.g. --server.port 8501]
+    python run_app.py --warmup-only
+"""
+import importlib
+import os
+import sys
+import time
+
+APP_SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "app_biocurator.py")
+
+# Imported in this order so that each timing only covers the module itself
+HEAVY_IMPORTS = ["pandas", "pyarrow", "streamlit", "altair", "st_aggrid", "biocurator_data", "biocurator_cache"]
+
+
+def warm_up():
+    """
+    Import heavy modules and fill the shared caches.
+
+    Returns:
+    - list of (stage, seconds) tuples
+    """
+    timings = []
+    for module in HEAVY_IMPORTS:
+        start = time.perf_counter()
+        importlib.import_module(module)
+        timings.append((f"import {module}", time.perf_counter() - start))
+
+    import biocurator_cache
+    timings.extend(biocurator_cache.warm_up().items())
+    return timings
+
+
+def steady_state():
+    """Duration of the same dataset and default view lookups once the caches are warm"""
+    import biocurator_cache
+    start = time.perf_counter()
+    biocurator_cache.warm_up()
+    return time.perf_counter() - start
+
+
+def print_report(timings, steady_seconds):
+    width = max(len(stage) for stage, _ in timings)
+    print("Cold-start warm-up:")
+    for stage, seconds in timings:
+        print(f"  {stage:<{width}}  {seconds * 1000:8.1f} ms")
+    print(f"  {'total':<{width}}  {sum(seconds for _, seconds in timings) * 1000:8.1f} ms")
+    print(f"Steady-state dataset and default view lookup: {steady_seconds * 1000:.1f} ms")
+    sys.stdout.flush()
+
+
+def main():
+    args = sys.argv[1:]
+    warmup_only = "--warmup-only" in args
+    args = [arg for arg in args if arg != "--warmup-only"]
+
+    # Make the app modules importable as they are when Streamlit runs the script
+    sys.path.insert(0, os.path.dirname(APP_SCRIPT))
+    timings = warm_up()
+    print_report(timings, steady_state())
+    if warmup_only:
+        return
+
+    # Run the server in this process so it reuses the warmed-up modules and caches
+    from streamlit.web import cli as stcli
+    sys.argv = ["streamlit", "run", APP_SCRIPT] + args
+    sys.exit(stcli.main())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,237 @@
+"""
+Multi-process deployment of the Streamlit app.
+
+Runs several app worker processes behind a local reverse proxy with sticky sessions:
+
+    python serve_multi.py --workers 4 --port 8501
+
+- The dataset is converted once to memory-mapped Arrow files (output/dataset_arrow).
+  Every worker maps them read-only, so the dataset pages are shared between workers
+  instead of being loaded once per process.
+- Each worker is started with run_app.py (so it warms up before serving) on its own
+  port, from --port + 1 onwards, listening on 127.0.0.1 only.
+- The proxy listens on --port and pins each browser to one worker with a cookie: a
+  Streamlit session, its websocket and its download files live in a single process.
+
+Use app_load_test.py against the proxy to check that throughput scales with the
+number of workers.
+"""
+import argparse
+import asyncio
+import http.client
+import os
+import re
+import secrets
+import signal
+import subprocess
+import sys
+import time
+
+from biocurator_data import (AMBIGUITY_SCORES_TSV, ARROW_DATASET_ENV, DATASET_ARROW_DIR, PUBTATOR_PICKLE,
+                             RELEASE_DIFF_PROTEINS_TSV, RELEASE_DIFF_PUBLICATIONS_TSV, load_dataset,
+                             write_arrow_dataset)
+
+# run_app.py next to this script, so the workers start from any working directory
+RUN_APP = os.path.join(os.path.dirname(os.path.abspath(__file__)), "run_app.py")
+
+COOKIE_NAME = "biocurator_worker"
+BUFFER_SIZE = 1 << 16
+HEALTH_TIMEOUT = 180
+
+
+class StickyProxy:
+    """
+    HTTP and websocket reverse proxy that pins each client to a worker.
+
+    The worker is taken from the cookie set on the first response. Requests without
+    the cookie go to the worker with the fewest open connections, and their connection
+    is closed after the response so later requests (sent with the cookie) are routed
+    by it. Connections are otherwise piped as-is, which also carries websocket upgrades.
+    """
+
+    def __init__(self, backends):
+        self.backends = backends
+        self.active = [0] * len(backends)
+        self.cookie_pattern = re.compile(rb'(?im)^cookie:.*\b' + COOKIE_NAME.encode() + rb'=(\d+)')
+
+    def choose(self, head):
+        """Index of the worker for a request head, and whether the client still needs the cookie"""
+        match = self.cookie_pattern.search(head)
+        if match and int(match.group(1)) < len(self.backends):
+            return int(match.group(1)), False
+        return min(range(len(self.backends)), key=self.active.__getitem__), True
+
+    async def handle(self, client_reader, client_writer):
+        try:
+            head = await client_reader.readuntil(b'\r\n\r\n')
+        except (asyncio.IncompleteReadError, asyncio.LimitOverrunError, ConnectionError):
+            client_writer.close()
+            return
+        index, new_client = self.choose(head)
+        if new_client and not re.search(rb'(?im)^upgrade:\s*websocket', head):
+            lines = [line for line in head[:-4].split(b'\r\n') if not line.lower().startswith(b'connection:')]
+            head = b'\r\n'.join(lines + [b'Connection: close']) + b'\r\n\r\n'
+        try:
+            backend_reader, backend_writer = await asyncio.open_connection(*self.backends[index])
+        except OSError:
+            client_writer.write(b'HTTP/1.1 502 Bad Gateway\r\nContent-Length: 0\r\nConnection: close\r\n\r\n')
+            await client_writer.drain()
+            client_writer.close()
+            return
+        self.active[index] += 1
+        upstream = asyncio.ensure_future(self.pipe(client_reader, backend_writer))
+        try:
+            backend_writer.write(head)
+            # The connection ends when the worker closes it
+            await self.pipe(backend_reader, client_writer, index if new_client else None)
+        finally:
+            upstream.cancel()
+            self.active[index] -= 1
+            backend_writer.close()
+            client_writer.close()
+
+    async def pipe(self, reader, writer, set_cookie=None):
+        """Copy a stream until EOF, adding the worker cookie to the first response head if given"""
+        try:
+            if set_cookie is not None:
+                head = await reader.readuntil(b'\r\n\r\n')
+                cookie = f"Set-Cookie: {COOKIE_NAME}={set_cookie}; Path=/; HttpOnly; SameSite=Lax\r\n"
+                writer.write(head[:-2] + cookie.encode() + b'\r\n')
+            while True:
+                data = await reader.read(BUFFER_SIZE)
+                if not data:
+                    break
+                writer.write(data)
+                await writer.drain()
+        except (asyncio.IncompleteReadError, asyncio.LimitOverrunError, ConnectionError):
+            pass
+        if writer.can_write_eof() and not writer.is_closing():
+            try:
+                writer.write_eof()
+            except OSError:
+                pass
+
+
+def prepare_arrow_dataset(path=PUBTATOR_PICKLE, directory=DATASET_ARROW_DIR, ambiguity_path=AMBIGUITY_SCORES_TSV,
+                          release_diff_paths=(RELEASE_DIFF_PROTEINS_TSV, RELEASE_DIFF_PUBLICATIONS_TSV)):
+    """
+    (Re)build the Arrow copy of the dataset when it is missing or older than the pickle or
+    the files merged into it (alias ambiguity scores and release diff)
+    """
+    if not os.path.exists(path):
+        raise FileNotFoundError(f"Dataset pickle not found: {path}")
+    marker = os.path.join(directory, "links.arrow")
+    sources = [source for source in [path, ambiguity_path, *(release_diff_paths or [])]
+               if source and os.path.exists(source)]
+    if os.path.exists(marker) and os.path.getmtime(marker) >= max(map(os.path.getmtime, sources)):
+        return False
+    write_arrow_dataset(*load_dataset(path, ambiguity_path, release_diff_paths), directory)
+    return True
+
+
+def start_workers(num_workers, base_port, directory, streamlit_args):
+    """Start the worker processes, sharing the dataset directory and the cookie secret"""
+    env = dict(os.environ, **{
+        ARROW_DATASET_ENV: os.path.abspath(directory),
+        # Streamlit only accepts the cookie secret from the config file or the environment
+        "STREAMLIT_SERVER_COOKIE_SECRET": os.environ.get("STREAMLIT_SERVER_COOKIE_SECRET", secrets.token_hex(32)),
+    })
+    workers = []
+    for index in range(num_workers):
+        port = base_port + 1 + index
+        command = [
+            sys.executable, RUN_APP,
+            "--server.port", str(port),
+            "--server.address", "127.0.0.1",
+            "--server.headless", "true",
+        ] + streamlit_args
+        workers.append((port, subprocess.Popen(command, env=env)))
+    return workers
+
+
+def wait_until_healthy(port, process, timeout=HEALTH_TIMEOUT):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"Worker on port {port} exited with code {process.returncode}")
+        try:
+            conn = http.client.HTTPConnection("127.0.0.1", port, timeout=2)
+            conn.request("GET", "/_stcore/health")
+            if conn.getresponse().status == 200:
+                return
+        except OSError:
+            pass
+        time.sleep(0.5)
+    raise RuntimeError(f"Worker on port {port} did not become healthy in {timeout}s")
+
+
+def memory_usage(pid):
+    """Resident, proportional and shared memory of a process in MB, from /proc/<pid>/smaps_rollup"""
+    usage = {}
+    with open(f"/proc/{pid}/smaps_rollup") as fh:
+        for line in fh:
+            parts = line.split()
+            if parts[0] in ('Rss:', 'Pss:', 'Shared_Clean:', 'Shared_Dirty:'):
+                usage[parts[0][:-1]] = int(parts[1]) / 1024
+    usage['Shared'] = usage.pop('Shared_Clean', 0) + usage.pop('Shared_Dirty', 0)
+    return usage
+
+
+def print_memory_report(workers):
+    print(f"{'worker':<14}{'RSS MB':>10}{'PSS MB':>10}{'shared MB':>12}")
+    for port, process in workers:
+        try:
+            usage = memory_usage(process.pid)
+        except OSError:
+            continue
+        print(f"{'port ' + str(port):<14}{usage['Rss']:>10.1f}{usage['Pss']:>10.1f}{usage['Shared']:>12.1f}")
+
+
+async def serve(host, port, backends):
+    proxy = StickyProxy(backends)
+    server = await asyncio.start_server(proxy.handle, host, port, limit=BUFFER_SIZE)
+    async with server:
+        await server.serve_forever()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workers", type=int, default=os.cpu_count(), help="Number of app worker processes")
+    parser.add_argument("--host", default="0.0.0.0", help="Address the proxy listens on")
+    parser.add_argument("--port", type=int, default=8501, help="Port of the proxy; workers use the following ports")
+    parser.add_argument("--data", default=PUBTATOR_PICKLE, help="Path to the pubtator pickle")
+    parser.add_argument("--arrow-dir", default=DATASET_ARROW_DIR, help="Directory of the memory-mapped dataset")
+    parser.add_argument("--prepare-only", action="store_true",
+                        help="Rebuild the memory-mapped dataset and exit, without starting the workers")
+    args, streamlit_args = parser.parse_known_args()
+    if not os.path.exists(args.data):
+        parser.error(f"dataset pickle not found: {args.data}")
+
+    start = time.perf_counter()
+    if args.prepare_only:
+        write_arrow_dataset(*load_dataset(args.data), args.arrow_dir)
+        print(f"Wrote the memory-mapped dataset to {args.arrow_dir} ({time.perf_counter() - start:.1f}s)")
+        return
+    if prepare_arrow_dataset(args.data, args.arrow_dir):
+        print(f"Wrote the memory-mapped dataset to {args.arrow_dir} ({time.perf_counter() - start:.1f}s)")
+
+    workers = start_workers(args.workers, args.port, args.arrow_dir, streamlit_args)
+    try:
+        for port, process in workers:
+            wait_until_healthy(port, process)
+        print(f"{len(workers)} workers ready ({time.perf_counter() - start:.1f}s)")
+        print_memory_report(workers)
+        print(f"Serving on http://{args.host}:{args.port}")
+        signal.signal(signal.SIGTERM, lambda *_: sys.exit(0))
+        asyncio.run(serve(args.host, args.port, [("127.0.0.1", port) for port, _ in workers]))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        for _, process in workers:
+            process.terminate()
+        for _, process in workers:
+            process.wait()
+
+
+if __name__ == "__main__":
+    main()
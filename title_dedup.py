@@ -0,0 +1,247 @@
+"""
+Near-duplicate publication detection over titles with MinHash LSH.
+
+The same work often appears under several PMIDs (a preprint and its journal
+version, corrected or re-indexed records), with the same or slightly reworded
+title. This stage clusters them and adds a canonical_pmid column to every
+publication table of the pubtator pickle, which the app can collapse on:
+
+    python title_dedup.py [--data output/pubtator_pubs.pkl] [--report output/duplicate_titles.tsv]
+
+pubtator_ingest.py runs it when building the dataset.
+
+Titles are reduced to sets of word bigrams and summarized by MinHash
+signatures. Signatures are split into bands and titles sharing a band are
+candidates; candidates are kept when their estimated Jaccard similarity reaches
+the threshold. Only titles that share a band are compared, so the stage runs
+in near-linear time instead of comparing every pair of titles.
+
+Short titles ("Editorial", "Poster Session") are shared by unrelated records, so
+titles with fewer than MIN_SHINGLES bigrams are never clustered. Duplicates must
+also be published at most MAX_YEAR_GAP years apart, in the same journal unless
+one of them is a preprint.
+"""
+import argparse
+import pickle as cp
+import re
+
+import numpy as np
+import pandas as pd
+
+from biocurator_data import PUBTATOR_PICKLE
+
+NUM_PERMUTATIONS = 128
+NUM_BANDS = 16
+SIMILARITY_THRESHOLD = 0.9
+# Titles with fewer distinct word bigrams are too generic to be clustered
+MIN_SHINGLES = 3
+# Most preprints are published within two years
+MAX_YEAR_GAP = 2
+# Every pair of documents is compared in buckets of up to this size, each document with the first one in larger buckets
+MAX_BUCKET_SIZE = 50
+# The journal version is preferred over a preprint as the canonical publication
+PREPRINT_JOURNALS = re.compile(r'rxiv|research square|res sq|preprints|ssrn|arxiv', re.IGNORECASE)
+# Retraction, correction and erratum notices repeat the title of the article they are
+# about, but are kept as publications of their own
+NOTICE_TITLES = re.compile(
+    r'^\s*(?:retraction|retracted|correction|correction to|author correction|publisher correction|erratum|'
+    r'corrigendum|expression of concern|editorial expression of concern)\b.{0,20}?:|\[(?:retraction|retracted|erratum)\]',
+    re.IGNORECASE
+)
+
+
+def title_shingles(titles):
+    """
+    Word-bigram shingles of each title (none for one-word titles).
+
+    Returns:
+    - array of title positions, sorted
+    - array of the uint64 hashes of their shingles, one per distinct (title, shingle)
+    """
+    words = pd.Series(titles, dtype=object).fillna('').str.lower().str.findall(r'[a-z0-9]+').explode().dropna()
+    docs = words.index.values.astype(np.int64)
+    words = words.values.astype(str)
+    same_title = np.zeros(len(docs), dtype=bool)
+    same_title[:-1] = docs[:-1] == docs[1:]
+    bigrams = np.char.add(np.char.add(words[:-1], ' '), words[1:]) if len(words) > 1 else np.array([], dtype=str)
+    shingle_docs = docs[:-1][same_title[:-1]]
+    hashes = pd.util.hash_array(bigrams[same_title[:-1]].astype(object), categorize=False)
+    pairs = pd.DataFrame({'doc': shingle_docs, 'hash': hashes}).drop_duplicates().sort_values('doc', kind='stable')
+    return pairs['doc'].values, pairs['hash'].values
+
+
+def minhash_signatures(num_docs, docs, hashes, num_permutations=NUM_PERMUTATIONS, seed=0, docs_per_chunk=4096):
+    """
+    MinHash signatures of the shingle sets, with multiply-shift hash functions.
+    Documents without shingles get an all-max signature and are left out of the LSH.
+    """
+    rng = np.random.default_rng(seed)
+    multipliers = rng.integers(1, 2 ** 63, num_permutations, dtype=np.uint64) | np.uint64(1)
+    offsets = rng.integers(0, 2 ** 63, num_permutations, dtype=np.uint64)
+    signatures = np.full((num_docs, num_permutations), np.iinfo(np.uint32).max, dtype=np.uint32)
+    # Chunks of whole documents bound the size of the (shingles x permutations) matrix
+    boundaries = np.searchsorted(docs, np.r_[np.arange(0, num_docs, docs_per_chunk), num_docs])
+    for start, stop in zip(boundaries[:-1], boundaries[1:]):
+        if start == stop:
+            continue
+        chunk_docs = docs[start:stop]
+        with np.errstate(over='ignore'):
+            values = ((hashes[start:stop, None] * multipliers[None, :] + offsets[None, :]) >> np.uint64(32)).astype(np.uint32)
+        starts = np.flatnonzero(np.r_[True, chunk_docs[1:] != chunk_docs[:-1]])
+        signatures[chunk_docs[starts]] = np.minimum.reduceat(values, starts, axis=0)
+    return signatures
+
+
+def candidate_pairs(signatures, has_shingles, num_bands=NUM_BANDS, threshold=SIMILARITY_THRESHOLD, seed=1,
+                    max_bucket_size=MAX_BUCKET_SIZE):
+    """
+    Pairs of documents sharing a band of their signatures whose estimated Jaccard
+    similarity is at least the threshold. Every pair of a bucket is compared, except in
+    buckets of more than max_bucket_size documents, where each document is only compared
+    with the first one, so that the number of comparisons stays linear.
+    """
+    rows = signatures.shape[1] // num_bands
+    rng = np.random.default_rng(seed)
+    candidates = np.flatnonzero(has_shingles)
+    if len(candidates) == 0:
+        return np.array([], dtype=np.int64), np.array([], dtype=np.int64)
+    left, right = [], []
+    for band in range(num_bands):
+        columns = signatures[candidates, band * rows:(band + 1) * rows].astype(np.uint64)
+        mixers = rng.integers(1, 2 ** 63, rows, dtype=np.uint64) | np.uint64(1)
+        with np.errstate(over='ignore'):
+            keys = (columns * mixers[None, :]).sum(axis=1, dtype=np.uint64)
+        order = np.argsort(keys, kind='stable')
+        sorted_keys = keys[order]
+        bucket_start = np.r_[True, sorted_keys[1:] != sorted_keys[:-1]]
+        bucket = np.cumsum(bucket_start) - 1
+        sizes = np.bincount(bucket)
+        small = sizes[bucket] <= max_bucket_size
+        # In small buckets, each document with every document after it
+        members, heads = [], []
+        for offset in range(1, int(sizes[sizes <= max_bucket_size].max(initial=1))):
+            same = small[offset:] & (bucket[offset:] == bucket[:-offset])
+            members.append(order[offset:][same])
+            heads.append(order[:-offset][same])
+        # In large buckets, each document with the first one
+        first = order[np.flatnonzero(bucket_start)][bucket]
+        large = ~small & (first != order)
+        members = np.concatenate(members + [order[large]])
+        heads = np.concatenate(heads + [first[large]])
+        similarity = (signatures[candidates[members]] == signatures[candidates[heads]]).mean(axis=1)
+        keep = similarity >= threshold
+        left.append(candidates[members[keep]])
+        right.append(candidates[heads[keep]])
+    return np.concatenate(left), np.concatenate(right)
+
+
+def compatible_pairs(publications, left, right, max_year_gap=MAX_YEAR_GAP):
+    """
+    Mask of the pairs of publications that can be versions of the same work: published at
+    most max_year_gap years apart, and in the same journal unless one of them is a preprint.
+    Missing years and journals do not rule a pair out.
+    """
+    keep = np.ones(len(left), dtype=bool)
+    if 'year' in publications.columns:
+        years = pd.to_numeric(publications['year'], errors='coerce').values
+        keep &= ~(np.abs(years[left] - years[right]) > max_year_gap)
+    if 'journal' in publications.columns:
+        journals = publications['journal'].astype(object).fillna('').astype(str).str.strip().str.lower().values
+        preprint = pd.Series(journals).str.contains(PREPRINT_JOURNALS).values
+        keep &= (journals[left] == journals[right]) | preprint[left] | preprint[right] | \
+            (journals[left] == '') | (journals[right] == '')
+    return keep
+
+
+def connected_components(num_docs, left, right):
+    """Component label (smallest member) of each document, by hooking and pointer jumping"""
+    labels = np.arange(num_docs)
+    while True:
+        hooked = labels.copy()
+        np.minimum.at(hooked, labels[left], labels[right])
+        np.minimum.at(hooked, labels[right], labels[left])
+        while True:
+            jumped = hooked[hooked]
+            if np.array_equal(jumped, hooked):
+                break
+            hooked = jumped
+        if np.array_equal(hooked, labels):
+            return labels
+        labels = hooked
+
+
+def canonical_pmids(publications, threshold=SIMILARITY_THRESHOLD):
+    """
+    Canonical PMID of each publication: the PMID representing its cluster of
+    near-duplicate titles, preferring a journal version over a preprint, then the
+    smallest PMID.
+
+    publications has one row per PMID with pmid, title and (optionally) year and journal.
+    Returns a Series of canonical PMIDs aligned with publications.
+    """
+    publications = publications.reset_index(drop=True)
+    num_docs = len(publications)
+    titles = publications['title'].fillna('').astype(str)
+    docs, hashes = title_shingles(titles.values)
+    signatures = minhash_signatures(num_docs, docs, hashes)
+    has_shingles = np.bincount(docs, minlength=num_docs) >= MIN_SHINGLES
+    has_shingles &= ~titles.str.contains(NOTICE_TITLES).values
+    left, right = candidate_pairs(signatures, has_shingles, threshold=threshold)
+    keep = compatible_pairs(publications, left, right)
+    left, right = left[keep], right[keep]
+    labels = connected_components(num_docs, left, right)
+
+    pmids = publications['pmid'].astype(np.int64).values
+    journals = publications['journal'] if 'journal' in publications.columns else pd.Series('', index=publications.index)
+    preprint = journals.fillna('').astype(str).str.contains(PREPRINT_JOURNALS).values
+    order = np.lexsort((pmids, preprint, labels))
+    first = np.r_[True, labels[order][1:] != labels[order][:-1]]
+    canonical = pd.Series(pmids[order][first], index=labels[order][first])
+    return pd.Series(canonical.reindex(labels).values, index=publications.index, name='canonical_pmid')
+
+
+def add_canonical_pmids(unreviewed_dict, threshold=SIMILARITY_THRESHOLD):
+    """
+    Add a canonical_pmid column (same type as pmid) to every publication table of a pickle's unreviewed_dict.
+
+    Returns:
+    - DataFrame of the PMIDs in clusters of more than one title, with their canonical PMID and title
+    """
+    tables = {uniprot_id: pubs for uniprot_id, pubs in unreviewed_dict.items()
+              if isinstance(pubs, pd.DataFrame) and not pubs.empty}
+    columns = [col for col in ['pmid', 'title', 'year', 'journal']
+               if all(col in pubs.columns for pubs in tables.values())]
+    publications = pd.concat([pubs[columns] for pubs in tables.values()], ignore_index=True) if tables else \
+        pd.DataFrame(columns=['pmid', 'title'])
+    publications = publications.assign(pmid=publications['pmid'].astype(np.int64)).drop_duplicates('pmid')
+    publications['canonical_pmid'] = canonical_pmids(publications, threshold).values
+    canonical = publications.set_index('pmid')['canonical_pmid']
+    for uniprot_id, pubs in tables.items():
+        values = pubs['pmid'].astype(np.int64).map(canonical)
+        unreviewed_dict[uniprot_id] = pubs.assign(canonical_pmid=values.astype(pubs['pmid'].dtype))
+    sizes = publications['canonical_pmid'].map(publications['canonical_pmid'].value_counts())
+    return publications[sizes > 1].sort_values(['canonical_pmid', 'pmid'])[['canonical_pmid'] + columns]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--data", default=PUBTATOR_PICKLE, help="Path to the pubtator pickle")
+    parser.add_argument("--out", help="Output pickle (default: update --data in place)")
+    parser.add_argument("--threshold", type=float, default=SIMILARITY_THRESHOLD,
+                        help="Estimated Jaccard similarity of title bigrams for two titles to be duplicates")
+    parser.add_argument("--report", help="Optional output TSV of the clusters of duplicate titles")
+    args = parser.parse_args()
+
+    with open(args.data, "rb") as fh:
+        non_nd_df, unreviewed_dict = cp.load(fh)
+    duplicates = add_canonical_pmids(unreviewed_dict, args.threshold)
+    with open(args.out or args.data, "wb") as fh:
+        cp.dump((non_nd_df, unreviewed_dict), fh)
+    print(f"Found {duplicates['canonical_pmid'].nunique()} clusters of near-duplicate titles "
+          f"({len(duplicates)} PMIDs); wrote {args.out or args.data}")
+    if args.report:
+        duplicates.to_csv(args.report, sep="\t", index=False)
+
+
+if __name__ == "__main__":
+    main()